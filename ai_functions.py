@@ -6,6 +6,8 @@ import json
 from requests.exceptions import RequestException, Timeout, HTTPError
 from pydantic import BaseModel
 from openai import OpenAI
+from log_functions import log_payload
+from http_functions import get_http_session, get_openai_http_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,11 +17,15 @@ load_dotenv()
 
 PPLX_API_KEY = os.getenv("PPLX_API_KEY")
 
-class PerplexityAPIError(Exception):
+class ProviderError(Exception):
+    """Base exception for errors from any AI provider"""
+    pass
+
+class PerplexityAPIError(ProviderError):
     """Custom exception for Perplexity API errors"""
     pass
 
-class OpenAIAPIError(Exception):
+class OpenAIAPIError(ProviderError):
     """Custom exception for OpenAI API errors"""
     pass
 
@@ -64,18 +70,18 @@ def chat_completion_pplx(model, system_message, user_message, response_format=No
     }
 
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=600)
+        response = get_http_session().post(url, json=payload, headers=headers, timeout=600)
         response.raise_for_status()  # Raise exception for 4XX/5XX responses
         
         json_response = response.json()
         
         # Validate response structure
         if 'choices' not in json_response or not json_response['choices']:
-            logger.error(f"Invalid API response structure: {json_response}")
+            log_payload(logger, logging.ERROR, "Invalid API response structure", json_response, "api_error")
             raise PerplexityAPIError("Invalid response structure from Perplexity API")
         
         if 'message' not in json_response['choices'][0]:
-            logger.error(f"Missing message in API response: {json_response}")
+            log_payload(logger, logging.ERROR, "Missing message in API response", json_response, "api_error")
             raise PerplexityAPIError("Missing message in API response")
             
         return json_response
@@ -84,7 +90,7 @@ def chat_completion_pplx(model, system_message, user_message, response_format=No
         logger.error("Request to Perplexity API timed out")
         raise PerplexityAPIError("Request to Perplexity API timed out")
     except HTTPError as e:
-        logger.error(f"HTTP error from Perplexity API: {e.response.status_code} - {e.response.text}")
+        log_payload(logger, logging.ERROR, f"HTTP error from Perplexity API: {e.response.status_code}", e.response.text, "api_error")
         raise PerplexityAPIError(f"HTTP error from Perplexity API: {e.response.status_code}")
     except RequestException as e:
         logger.error(f"Error making request to Perplexity API: {str(e)}")
@@ -109,7 +115,7 @@ def chat_completion_openai(model, system_message, user_message, response_format=
     Raises: OpenAIAPIError if the API call fails
     """
     try:
-        client = OpenAI()
+        client = OpenAI(http_client=get_openai_http_client())
         response = client.beta.chat.completions.parse(
             model=model, 
             messages=[
@@ -0,0 +1,231 @@
+import datetime
+import html
+import logging
+import sqlite3
+from config import ARCHIVE_FILE
+from render_functions import TAG_PATTERN
+from state_functions import open_state_file, update_state_file, StateError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL,
+    title TEXT NOT NULL,
+    window_start TEXT,
+    window_end TEXT,
+    delivered_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    digest_id INTEGER NOT NULL REFERENCES digests(id),
+    category TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    link TEXT NOT NULL,
+    delivered_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_delivered_at ON items(delivered_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, description, category, content='items', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+# bm25 weights of the title, description and category columns
+RANK_WEIGHTS = (10.0, 1.0, 2.0)
+
+class ArchiveError(Exception):
+    """Custom exception for digest archive errors"""
+    pass
+
+def connect_archive(filename=None):
+    """
+    Open the archive database, creating its tables on first use.
+
+    Args:
+        filename: The archive database file (defaults to ARCHIVE_FILE)
+
+    Returns:
+        sqlite3.Connection: The connection, with rows as sqlite3.Row
+
+    Raises:
+        ArchiveError: If the database can't be opened
+    """
+    try:
+        connection = sqlite3.connect(filename or ARCHIVE_FILE, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        return connection
+    except sqlite3.Error as e:
+        raise ArchiveError(f"Error opening archive: {str(e)}")
+
+def _plain_text(text):
+    """Text of a sanitized digest field without its Telegram markup, e.g. "AT&T" for "<b>AT&amp;T</b>" """
+    return html.unescape(TAG_PATTERN.sub("", text))
+
+def archive_news_response(news_response, query_key, title, window_start=None, window_end=None,
+                          delivered_at=None, filename=None):
+    """
+    Add every item of a delivered digest to the archive.
+
+    Items are archived as plain text, without the markup and escaping of sanitized
+    digests, so "AT&amp;T" is indexed and shown as "AT&T". With STATE_BUCKET set, the archive is
+    updated in the bucket, so every function and the search command see the same one.
+
+    Args:
+        news_response: The delivered NewsResponse
+        query_key: The run history key of the query
+        title: The query title
+        window_start: Start of the time window the digest covers
+        window_end: End of the time window the digest covers
+        delivered_at: The time of delivery (defaults to now)
+        filename: The archive database file (defaults to ARCHIVE_FILE)
+
+    Returns:
+        int: The number of archived items
+
+    Raises:
+        ArchiveError: If the digest can't be written
+    """
+    delivered_at = (delivered_at or datetime.datetime.now()).isoformat()
+    rows = [
+        (
+            _plain_text(category.category), _plain_text(item.title),
+            _plain_text(item.description), html.unescape(item.link), delivered_at,
+        )
+        for category in news_response.news_items for item in category.news_items
+    ]
+
+    def write(path):
+        connection = connect_archive(path)
+        try:
+            with connection:
+                digest_id = connection.execute(
+                    "INSERT INTO digests (query, title, window_start, window_end, delivered_at) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        query_key, title,
+                        window_start.isoformat() if window_start else None,
+                        window_end.isoformat() if window_end else None,
+                        delivered_at,
+                    )
+                ).lastrowid
+                for row in rows:
+                    item_id = connection.execute(
+                        "INSERT INTO items (digest_id, category, title, description, link, delivered_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (digest_id, *row)
+                    ).lastrowid
+                    connection.execute(
+                        "INSERT INTO items_fts (rowid, title, description, category) VALUES (?, ?, ?, ?)",
+                        (item_id, row[1], row[2], row[0])
+                    )
+        except sqlite3.Error as e:
+            raise ArchiveError(f"Error writing to archive: {str(e)}")
+        finally:
+            connection.close()
+
+    try:
+        update_state_file(filename or ARCHIVE_FILE, write)
+    except StateError as e:
+        raise ArchiveError(f"Error writing to archive: {str(e)}")
+    return len(rows)
+
+def build_match_query(text):
+    """Turn search keywords into an FTS5 query matching all of them, so punctuation can't break the syntax"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search_archive(text="", since=None, until=None, query_key=None, limit=20, raw=False, filename=None):
+    """
+    Search archived news items, best matches first.
+
+    Items are ranked by BM25 over their title, description and category; without
+    search text the most recently delivered items come first. With STATE_BUCKET set,
+    the archive in the bucket is searched.
+
+    Args:
+        text: Keywords that must all appear (FTS5 query syntax if raw)
+        since: Only include items delivered at or after this time
+        until: Only include items delivered before this time
+        query_key: Only include items of this query (by run history key)
+        limit: Maximum number of results
+        raw: Whether text is an FTS5 query, e.g. 'solar OR wind' or 'title:"oil price"'
+        filename: The archive database file (defaults to ARCHIVE_FILE)
+
+    Returns:
+        list: Matches as dicts with query, query_title, window_start, window_end, category,
+        title, description, link, delivered_at, snippet and score (higher is better) keys
+
+    Raises:
+        ArchiveError: If the search fails, e.g. on invalid raw query syntax
+    """
+    conditions = []
+    parameters = []
+    if since:
+        conditions.append("items.delivered_at >= ?")
+        parameters.append(since.isoformat())
+    if until:
+        conditions.append("items.delivered_at < ?")
+        parameters.append(until.isoformat())
+    if query_key:
+        conditions.append("digests.query = ?")
+        parameters.append(query_key)
+
+    columns = """
+        digests.query, digests.title AS query_title, digests.window_start, digests.window_end,
+        items.category, items.title, items.description, items.link, items.delivered_at
+    """
+    match = text if raw else build_match_query(text)
+    if match:
+        # Rank and limit the matches first, so the joins and snippets are only computed for
+        # the top results rather than for every match (CROSS JOIN keeps them in that order)
+        filters = "".join(f" AND {condition}" for condition in conditions)
+        sql = f"""
+            WITH top AS (
+                SELECT items_fts.rowid AS id, bm25(items_fts, {", ".join(map(str, RANK_WEIGHTS))}) AS rank
+                FROM items_fts
+                {"JOIN items ON items.id = items_fts.rowid JOIN digests ON digests.id = items.digest_id" if conditions else ""}
+                WHERE items_fts MATCH ?{filters}
+                ORDER BY rank
+                LIMIT ?
+            )
+            SELECT {columns},
+                snippet(items_fts, 1, '[', ']', '…', 16) AS snippet,
+                top.rank AS score
+            FROM top
+            CROSS JOIN items_fts ON items_fts.rowid = top.id
+            JOIN items ON items.id = top.id
+            JOIN digests ON digests.id = items.digest_id
+            WHERE items_fts MATCH ?
+            ORDER BY top.rank
+        """
+        parameters = [match] + parameters + [limit, match]
+    else:
+        sql = f"""
+            SELECT {columns}, NULL AS snippet, NULL AS score
+            FROM items
+            JOIN digests ON digests.id = items.digest_id
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY items.delivered_at DESC
+            LIMIT ?
+        """
+        parameters = parameters + [limit]
+
+    try:
+        with open_state_file(filename or ARCHIVE_FILE) as path:
+            connection = connect_archive(path)
+            try:
+                rows = connection.execute(sql, parameters).fetchall()
+            except sqlite3.Error as e:
+                raise ArchiveError(f"Error searching archive: {str(e)}")
+            finally:
+                connection.close()
+    except StateError as e:
+        raise ArchiveError(f"Error searching archive: {str(e)}")
+
+    # bm25 ranks are lower for better matches; report higher-is-better scores
+    return [
+        dict(row, score=-row["score"] if row["score"] is not None else None)
+        for row in rows
+    ]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark of full-text search over an archive of years of delivered digests.
+
+Archives synthetic daily digests into a temporary SQLite FTS5 archive, then times
+ranked keyword searches, with and without date filters, against a linear scan of
+the same items (how the JSON results store would have to be searched).
+
+Usage: python benchmarks/bench_archive.py [years] [digests_per_day] [items_per_digest]
+"""
+
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from news_models import NewsItem, NewsCategory, NewsResponse
+from archive_functions import archive_news_response, search_archive
+
+SYLLABLES = ["ba", "ko", "ri", "tan", "mel", "sol", "ver", "qui", "dra", "pen", "lo", "zar", "ex", "um", "tor"]
+
+def make_vocabulary(rng, size=5000):
+    return list({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size)})
+
+def make_digest(rng, vocabulary, items):
+    def sentence(words):
+        # Zipf-like word frequencies, as in real text
+        return " ".join(vocabulary[min(int(rng.paretovariate(1.2)) - 1, len(vocabulary) - 1)] for _ in range(words))
+    return NewsResponse(news_items=[
+        NewsCategory(category=f"Category {c}", news_items=[
+            NewsItem(title=sentence(8), description=sentence(60), link=f"https://example.com/{rng.random()}")
+            for _ in range(items // 3)
+        ])
+        for c in range(3)
+    ])
+
+def timed(function, runs):
+    durations = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result = function()
+        durations.append((time.perf_counter() - started_at) * 1000)
+    return result, statistics.median(durations), sorted(durations)[int(runs * 0.95)]
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    digests_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    items = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    filename = os.path.join(tempfile.mkdtemp(), "archive.db")
+
+    started_at = time.perf_counter()
+    start = datetime.datetime(2026, 10, 1) - datetime.timedelta(days=365 * years)
+    scan_items = []
+    for day in range(365 * years):
+        for query in range(digests_per_day):
+            delivered_at = start + datetime.timedelta(days=day, hours=query)
+            digest = make_digest(rng, vocabulary, items)
+            archive_news_response(digest, f"query_{query}", f"Query {query}", delivered_at=delivered_at, filename=filename)
+            scan_items.extend(
+                (delivered_at, f"{item.title} {item.description}".lower())
+                for category in digest.news_items for item in category.news_items
+            )
+    print(f"Archived {len(scan_items)} items from {years} years in {time.perf_counter() - started_at:.1f}s "
+          f"({os.path.getsize(filename) / 1024 / 1024:.0f} MB)")
+
+    # Words from very common to rarer, since ranking cost grows with the number of matches
+    terms = [vocabulary[rank] for rank in (10, 20, 30, 60)]
+    since = datetime.datetime(2026, 10, 1) - datetime.timedelta(days=30)
+    searches = (
+        ("one keyword", f"{terms[0]}", None),
+        ("two keywords", f"{terms[1]} {terms[2]}", None),
+        ("keyword, last 30 days", f"{terms[3]}", since),
+        ("latest, last 30 days", "", since),
+    )
+    for label, text, search_since in searches:
+        results, median, p95 = timed(lambda: search_archive(text, since=search_since, limit=10, filename=filename), 50)
+        words = text.split()
+        matches, scan_median, _ = timed(lambda: [
+            entry for entry in scan_items
+            if (search_since is None or entry[0] >= search_since) and all(word in entry[1] for word in words)
+        ], 5)
+        print(f"{label:>22}: {len(matches):6} matches; FTS5 top {len(results)} median {median:6.2f} ms, p95 {p95:6.2f} ms; linear scan {scan_median:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
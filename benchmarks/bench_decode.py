@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for decoding formatter output into NewsResponse.
+
+Compares the previous path (json.loads, then a new TypeAdapter for every call)
+with decode_news_response (json.loads, then the cached validator), and with the
+cached validator parsing the JSON text itself.
+
+Usage: python benchmarks/bench_decode.py [categories] [items_per_category]
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from news_models import NewsResponse
+from decode_functions import decode_news_response
+from bench_render import make_news_response
+
+def previous_decode(completion):
+    parsed_json = json.loads(completion)
+    return TypeAdapter(NewsResponse).validate_python(parsed_json)
+
+def main():
+    categories = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    items_per_category = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    news_response = make_news_response(categories, items_per_category)
+    outputs = (
+        ("non-ASCII", news_response.model_dump_json()),
+        ("ASCII", json.dumps(news_response.model_dump())),
+    )
+    adapter = TypeAdapter(NewsResponse)
+
+    for label, completion in outputs:
+        print(f"{label} formatter output: {categories} categories x {items_per_category} items, {len(completion) / 1024:.0f} KB")
+        assert previous_decode(completion) == decode_news_response(completion)
+        for name, decode in (
+            ("loads + new TypeAdapter", previous_decode),
+            ("validate_json", adapter.validate_json),
+            ("decode_news_response", decode_news_response),
+        ):
+            runs = 50
+            seconds = timeit.timeit(lambda: decode(completion), number=runs) / runs
+            print(f"{name:>24}: {seconds * 1000:7.2f} ms per decode")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Offline benchmark of citation link checking against a local HTTP stand-in.
+
+Serves live, redirecting, dead and HEAD-refusing pages from http.server and
+compares checking links one at a time with the concurrent pooled checker, cold
+and with a warm cache. The cleaning itself is tested in tests/test_link_functions.py.
+
+Usage: python benchmarks/bench_links.py [links] [delay_ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from link_functions import canonicalize_url, clean_links
+
+DELAY = 0.05
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Pages: /live/*, /redirect/* (to /live/* with tracking parameters), /dead/*, /no-head/*"""
+    def handle_request(self, head):
+        time.sleep(DELAY)
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/redirect/"):
+            self.send_response(301)
+            self.send_header("Location", path.replace("/redirect/", "/live/", 1) + "?utm_source=feed&id=7")
+        elif path.startswith("/dead/"):
+            self.send_response(404)
+        elif path.startswith("/no-head/") and head:
+            self.send_response(405)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 would serialize concurrent connections
+    request_queue_size = 128
+
+def check_sequentially(urls):
+    """The naive approach: one blocking request per link, without a cache"""
+    session = requests.Session()
+    return {url: session.head(url, allow_redirects=True, timeout=5).status_code < 400 for url in urls}
+
+def main():
+    global DELAY
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    cache_file = os.path.join(tempfile.mkdtemp(), "link_cache.json")
+
+    try:
+        kinds = ("live", "redirect", "dead", "no-head")
+        urls = [f"{base}/{kinds[i % len(kinds)]}/{i}?utm_campaign=bench" for i in range(count)]
+        print(f"{count} citation links, {DELAY * 1000:.0f} ms per response:")
+
+        started_at = time.perf_counter()
+        check_sequentially([canonicalize_url(url) for url in urls])
+        print(f"{'sequential':>18}: {time.perf_counter() - started_at:6.2f}s")
+
+        for label in ("concurrent, cold", "concurrent, cached"):
+            started_at = time.perf_counter()
+            cleaned = clean_links(urls, resolve=True, filename=cache_file)
+            print(f"{label:>18}: {time.perf_counter() - started_at:6.2f}s ({sum(url is None for url in cleaned.values())} dead)")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
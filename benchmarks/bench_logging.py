@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Measure the bytes logged by one research run, with full payloads and with the
+default truncated payload logging.
+
+API calls are replaced with canned responses the size of a long digest, so the
+run is offline and only exercises logging and message handling.
+
+Usage: python benchmarks/bench_logging.py [items]
+"""
+
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_once(items):
+    """Run the daily pipeline once and print the records and bytes logged"""
+    sys.path.insert(0, ROOT)
+    import tempfile
+    directory = tempfile.mkdtemp()
+    os.environ["RUN_HISTORY_FILE"] = os.path.join(directory, "run_history.json")
+    os.environ["RESULTS_STORE_FILE"] = os.path.join(directory, "results_store.json")
+
+    from log_functions import LogByteCounter
+    counter = LogByteCounter()
+    counter.setFormatter(logging.Formatter("[%(levelname)s] %(asctime)s %(name)s %(message)s"))
+    logging.getLogger().addHandler(counter)
+    logging.getLogger().setLevel(logging.INFO)
+
+    import handler
+    import broadcast_functions
+    from config import MODEL, FORMATTING_MODEL
+    from provider_functions import FakeProvider, set_providers
+    from bench_render import make_news_response
+
+    news_response = make_news_response(max(items // 10, 1), 10)
+    content = "\n\n".join(
+        f"<b>{item.title}</b>\n{item.description}"
+        for category in news_response.news_items for item in category.news_items
+    )
+    set_providers("research", [FakeProvider(
+        "fake", "research", [MODEL], content=content,
+        citations=[f"https://example.com/{i}" for i in range(20)]
+    )])
+    set_providers("formatting", [FakeProvider("fake", "formatting", [FORMATTING_MODEL], content=news_response.model_dump_json())])
+    broadcast_functions.send_message_telegram_sync = lambda message, link, chat_id: {"ok": True}
+    # Deliver without waiting for Telegram's rate limits
+    broadcast_functions.TelegramSender = functools.partial(
+        broadcast_functions.TelegramSender, messages_per_second=1000, chat_interval=0
+    )
+
+    handler.daily_research(None, None)
+    print(json.dumps({"records": counter.records, "bytes": counter.bytes}))
+
+def measure(items, full_payloads):
+    env = dict(os.environ, LOG_FULL_PAYLOADS="1" if full_payloads else "0")
+    output = subprocess.run(
+        [sys.executable, __file__, "--run", str(items)],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    print(f"One daily run with a {items}-item digest:")
+    for label, full_payloads in (("full payloads (before)", True), ("truncated payloads", False)):
+        result = measure(items, full_payloads)
+        print(f"{label:>23}: {result['records']} records, {result['bytes'] / 1024:.1f} KiB logged")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        run_once(int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Offline benchmark of research provider routing with fake providers.
+
+The primary provider starts healthy, then degrades halfway through (slower and
+failing often) while the secondary stays healthy. Compares a static order, which
+always tries the primary first and fails over on errors, with the EWMA router.
+
+Usage: python benchmarks/bench_providers.py [calls] [latency_ms]
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the fake calls' model stats out of the real run history
+os.environ["RUN_HISTORY_FILE"] = os.path.join(tempfile.mkdtemp(), "run_history.json")
+
+from ai_functions import ProviderError
+from provider_functions import FakeProvider, ProviderRouter
+
+def make_providers(latency):
+    primary = FakeProvider("primary", "research", ["sonar"], latency=latency, jitter=latency / 2, seed=1)
+    secondary = FakeProvider("secondary", "research", ["sonar"], latency=latency * 1.5, jitter=latency / 2, seed=2)
+    return primary, secondary
+
+def static_call(providers):
+    last_error = None
+    for provider in providers:
+        try:
+            return provider, provider.complete(provider.models[0], "system", "query")
+        except ProviderError as e:
+            last_error = e
+    raise last_error
+
+def run(label, calls, latency, routed):
+    primary, secondary = make_providers(latency)
+    router = ProviderRouter("research", [primary, secondary])
+    durations = []
+    failures = 0
+    for i in range(calls):
+        if i == calls // 2:
+            # The primary degrades: four times slower and failing 40% of calls
+            primary.latency, primary.failure_rate = latency * 4, 0.4
+        started_at = time.perf_counter()
+        try:
+            if routed:
+                router.call("system", "query")
+            else:
+                static_call([primary, secondary])
+        except ProviderError:
+            failures += 1
+        durations.append(time.perf_counter() - started_at)
+
+    degraded = durations[calls // 2:]
+    print(
+        f"{label:>12}: mean {statistics.mean(durations) * 1000:6.1f} ms, "
+        f"after degradation mean {statistics.mean(degraded) * 1000:6.1f} ms, "
+        f"p95 {sorted(degraded)[int(len(degraded) * 0.95)] * 1000:6.1f} ms, failed calls {failures}"
+    )
+    if routed:
+        for name, health in router.health.items():
+            print(f"{'':>14}{name}: {health.calls} calls, EWMA latency {health.latency * 1000:.1f} ms, error rate {health.error_rate:.2f}")
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 10) / 1000
+    logging.getLogger("provider_functions").setLevel(logging.ERROR)
+    print(f"{calls} research calls, base latency {latency * 1000:.0f} ms:")
+    run("static order", calls, latency, routed=False)
+    run("EWMA router", calls, latency, routed=True)
+
+if __name__ == "__main__":
+    main()
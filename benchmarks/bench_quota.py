@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Benchmark of the shared quota governor with concurrent processes.
+
+Several processes stand in for overlapping Lambda invocations, each making fake
+model calls. The governor is shared through a temporary SQLite backend. The
+provider's rate limiter is simulated on the recorded call times, to count the
+calls that would have been rejected with a 429, without and with the governor.
+
+Usage: python benchmarks/bench_quota.py [processes] [calls_per_process] [requests_per_second] [burst]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quota_functions import QuotaGovernor, SQLiteQuotaBackend
+
+CALL_SECONDS = 0.02
+
+def invocation(args):
+    """One simulated invocation: calls one after another, returning when each was sent"""
+    filename, quotas, calls, governed = args
+    governor = QuotaGovernor(SQLiteQuotaBackend(filename), quotas)
+    sent = []
+    for _ in range(calls):
+        if governed:
+            reservation = governor.acquire("fake", "model", 1000)
+        sent.append(time.time())
+        time.sleep(CALL_SECONDS)
+        if governed:
+            governor.settle(reservation, 800)
+    return sent
+
+def count_rejected(times, rate, burst):
+    """Replay call times through the provider's token bucket, counting calls it would reject"""
+    available, last, rejected = burst, None, 0
+    for sent in sorted(times):
+        if last is not None:
+            available = min(burst, available + (sent - last) * rate)
+        last = sent
+        # Allow for a few milliseconds of timing jitter between processes
+        if available >= 1 - 0.05:
+            available -= 1
+        else:
+            rejected += 1
+    return rejected
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    burst = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+    quotas = {"fake": {"requests_per_minute": rate * 60, "burst": burst, "tokens_per_minute": rate * 60 * 1000}}
+    print(f"{processes} invocations x {calls} calls, limit {rate:.0f} requests/s with bursts of {burst}:")
+
+    for label, governed in (("ungoverned", False), ("governed", True)):
+        filename = os.path.join(tempfile.mkdtemp(), "quota.db")
+        SQLiteQuotaBackend(filename)
+        started_at = time.time()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(invocation, [(filename, quotas, calls, governed)] * processes)
+        elapsed = time.time() - started_at
+        times = [sent for result in results for sent in result]
+        print(f"{label:>11}: {elapsed:5.2f}s, {count_rejected(times, rate, burst)} of {len(times)} calls over the limit")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Benchmark for rendering large digests into Telegram messages.
+
+Compares the previous greedy += renderer with the block packing engine on
+synthetic NewsResponse trees and checks every part against Telegram's limits.
+
+Usage: python benchmarks/bench_render.py [categories] [items_per_category]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from news_models import NewsItem, NewsCategory, NewsResponse
+from render_functions import render_news_blocks, pack_blocks, telegram_length, tokenize_html, tag_name
+
+WORDS = ["market", "policy", "rates", "growth", "AI", "chip", "energy", "climate", "India", "US",
+         "₹1,200 crore", "naïve", "café", "😀", "🚀", "🇮🇳", "R&amp;D", "&lt;10%"]
+
+def make_news_response(categories, items_per_category, seed=42):
+    """Build a synthetic NewsResponse with multibyte characters and entities"""
+    rng = random.Random(seed)
+    def sentence(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+    return NewsResponse(news_items=[
+        NewsCategory(category=f"Category {c} {sentence(2)}", news_items=[
+            NewsItem(
+                title=sentence(rng.randint(5, 12)),
+                description=sentence(rng.randint(40, 160)),
+                link=f"https://example.com/{c}/{i}?utm_source=feed"
+            )
+            for i in range(items_per_category)
+        ])
+        for c in range(categories)
+    ])
+
+def greedy_render(news_response, title, max_message_size=4000):
+    """The previous renderer: += concatenation with a greedy cutoff in Python characters"""
+    messages = []
+    current_message = f"Here are the top {title} news for you:\n\n"
+    current_size = len(current_message)
+    for category in news_response.news_items:
+        category_header = f"<b><u>📌 {category.category}</u></b>\n\n"
+        if current_size + len(category_header) > max_message_size:
+            messages.append(current_message)
+            current_message = category_header
+            current_size = len(category_header)
+        else:
+            current_message += category_header
+            current_size += len(category_header)
+        for item in category.news_items:
+            item_text = f"<b>{item.title}</b>\n{item.description}\n{item.link}\n\n"
+            if current_size + len(item_text) > max_message_size:
+                messages.append(current_message)
+                current_message = item_text
+                current_size = len(item_text)
+            else:
+                current_message += item_text
+                current_size += len(item_text)
+        current_message += "\n\n"
+    messages.append(current_message)
+    return messages
+
+def packed_render(news_response, title, max_message_size=4000):
+    return pack_blocks(render_news_blocks(news_response, title), max_message_size)
+
+def check_parts(messages, limit=4000):
+    """Count parts over the limit and parts with unbalanced tags"""
+    too_long = sum(1 for message in messages if telegram_length(message) > limit)
+    unbalanced = 0
+    for message in messages:
+        depth = 0
+        for kind, value in tokenize_html(message):
+            if kind == "tag" and tag_name(value):
+                depth += -1 if value.startswith("</") else 1
+        unbalanced += depth != 0
+    return too_long, unbalanced
+
+def main():
+    categories = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    items_per_category = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    news_response = make_news_response(categories, items_per_category)
+    print(f"Synthetic digest: {categories} categories x {items_per_category} items")
+
+    for name, render in (("greedy +=", greedy_render), ("block packing", packed_render)):
+        runs = 5
+        seconds = timeit.timeit(lambda: render(news_response, "Benchmark"), number=runs) / runs
+        messages = render(news_response, "Benchmark")
+        too_long, unbalanced = check_parts(messages)
+        print(f"{name:>14}: {seconds * 1000:8.1f} ms, {len(messages)} parts, "
+              f"{too_long} over Telegram's limit, {unbalanced} with unbalanced tags")
+
+if __name__ == "__main__":
+    main()
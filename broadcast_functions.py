@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from config import SUBSCRIPTIONS, TELEGRAM_MAX_CONCURRENCY, TELEGRAM_MESSAGES_PER_SECOND, TELEGRAM_CHAT_INTERVAL
+from telegram_functions import send_message_telegram_sync, TelegramAPIError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class TelegramSender:
+    """
+    Rate-limited Telegram sender shared by all deliveries of a broadcast.
+    
+    Keeps under Telegram's bot limits: an overall messages-per-second rate and a
+    minimum interval between messages to the same chat. Up to max_concurrency
+    requests are in flight at once.
+    """
+    def __init__(self, max_concurrency=TELEGRAM_MAX_CONCURRENCY,
+                 messages_per_second=TELEGRAM_MESSAGES_PER_SECOND, chat_interval=TELEGRAM_CHAT_INTERVAL):
+        self.interval = 1 / messages_per_second
+        self.chat_interval = chat_interval
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._next_send = 0.0
+        self._next_chat_send = {}
+    
+    async def _wait_turn(self, chat_id):
+        async with self._lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_send, self._next_chat_send.get(chat_id, 0.0))
+            self._next_send = send_at + self.interval
+            self._next_chat_send[chat_id] = send_at + self.chat_interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+    
+    async def send(self, chat_id, message, link=None):
+        """
+        Send one message once the rate limits allow it.
+        
+        Args:
+            chat_id: The chat to send to (None for TELEGRAM_CHANNEL_ID)
+            message: The message text
+            link: URL to include as a button (optional)
+            
+        Returns:
+            dict: The JSON response from the Telegram API call
+            
+        Raises:
+            TelegramAPIError: If the API call fails
+        """
+        await self._wait_turn(chat_id)
+        async with self._semaphore:
+            return await asyncio.to_thread(send_message_telegram_sync, message, link, chat_id)
+
+def get_subscribers(query_key):
+    """
+    Get the subscriptions for a query.
+    
+    Args:
+        query_key: The run history key of the query (title, or name for custom queries)
+        
+    Returns:
+        list: Subscriptions, each a dict with 'chat_id' and optional 'options'.
+              Queries without subscriptions go to the default channel.
+    """
+    return SUBSCRIPTIONS.get(query_key) or [{"chat_id": None}]
+
+def number_message_parts(messages):
+    """
+    Prefix each message with its part number if there is more than one.
+    
+    Args:
+        messages: The message parts
+        
+    Returns:
+        list: The messages to send
+    """
+    if len(messages) <= 1:
+        return list(messages)
+    return [f"Part {i+1}/{len(messages)}\n\n{msg}" for i, msg in enumerate(messages)]
+
+async def _deliver(sender, chat_id, messages, direct_link):
+    for i, msg in enumerate(messages):
+        # Only include direct_link on the last message
+        is_last_message = i == len(messages) - 1
+        await sender.send(chat_id, msg, direct_link if is_last_message else None)
+
+async def broadcast_digest(subscribers, render, direct_link, sender=None):
+    """
+    Deliver one researched digest to every subscriber concurrently.
+    
+    The digest is rendered once for each distinct set of formatting options, and
+    the parts for each chat are sent in order.
+    
+    Args:
+        subscribers: Subscriptions, each a dict with 'chat_id' and optional 'options'
+        render: Function taking formatting options and returning the message parts
+        direct_link: Perplexity search link attached to the last part
+        sender: A TelegramSender to share (a new one is created if None)
+        
+    Returns:
+        dict: Delivery status for each chat, with 'ok', 'parts' and 'error' keys
+    """
+    sender = sender or TelegramSender()
+    
+    rendered = {}
+    deliveries = []
+    for subscriber in subscribers:
+        options = subscriber.get("options") or {}
+        options_key = tuple(sorted(options.items()))
+        if options_key not in rendered:
+            rendered[options_key] = number_message_parts(render(**options))
+        deliveries.append((subscriber.get("chat_id"), rendered[options_key]))
+    
+    results = await asyncio.gather(
+        *(_deliver(sender, chat_id, messages, direct_link) for chat_id, messages in deliveries),
+        return_exceptions=True
+    )
+    
+    statuses = {}
+    for (chat_id, messages), result in zip(deliveries, results):
+        chat = str(chat_id) if chat_id else "default"
+        if isinstance(result, Exception):
+            logger.error(f"Delivery to chat {chat} failed: {str(result)}")
+            statuses[chat] = {"ok": False, "parts": len(messages), "error": str(result)}
+        else:
+            logger.info(f"Delivered {len(messages)} message parts to chat {chat}")
+            statuses[chat] = {"ok": True, "parts": len(messages), "error": None}
+    return statuses
+
+def raise_if_undelivered(statuses):
+    """
+    Raise if a broadcast reached no chat at all.
+    
+    Args:
+        statuses: Delivery statuses returned by broadcast_digest
+        
+    Raises:
+        TelegramAPIError: If every delivery failed
+    """
+    if statuses and not any(status["ok"] for status in statuses.values()):
+        errors = "; ".join(f"{chat}: {status['error']}" for chat, status in statuses.items())
+        raise TelegramAPIError(f"Delivery failed for every subscriber: {errors}")
@@ -0,0 +1,167 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+REDACTED = "<redacted>"
+SECRET_URL_PATTERN = re.compile(r"/bot[^/]+/")
+SECRET_KEY_PATTERN = re.compile(r"key|token|secret|password|authorization", re.IGNORECASE)
+
+class CassetteError(requests.ConnectionError):
+    """Raised when a replayed request has no recorded response"""
+    pass
+
+def redact_url(url):
+    """Remove secrets, such as the Telegram bot token, from a URL"""
+    return SECRET_URL_PATTERN.sub(f"/bot{REDACTED}/", url)
+
+def redact_body(body):
+    """Remove secrets from a JSON request body, returning it as text"""
+    if not body:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+
+    def redact(value):
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if SECRET_KEY_PATTERN.search(key) else redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [redact(item) for item in value]
+        return value
+
+    return json.dumps(redact(data), ensure_ascii=False)
+
+class Cassette:
+    """
+    A JSONL file of recorded HTTP exchanges.
+
+    In record mode every exchange is appended as one line, with secrets redacted.
+    In replay mode exchanges are served in recorded order for each method and URL,
+    optionally sleeping for the recorded latency scaled by speed (0 for no delay,
+    1 for the original timing, 0.1 for ten times faster).
+    """
+    def __init__(self, path, mode, speed=0.0):
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._exchanges = defaultdict(deque)
+
+        if mode == "replay":
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        exchange = json.loads(line)
+                        self._exchanges[(exchange["method"], exchange["url"])].append(exchange)
+            logger.info(f"Replaying {sum(map(len, self._exchanges.values()))} recorded exchanges from {path}")
+        elif mode == "record":
+            # Start a fresh cassette
+            open(path, "w").close()
+            logger.info(f"Recording HTTP exchanges to {path}")
+
+    def record(self, method, url, request_body, status, content_type, body, elapsed):
+        exchange = {
+            "method": method,
+            "url": redact_url(url),
+            "request_body": redact_body(request_body),
+            "status": status,
+            "content_type": content_type,
+            "body": body,
+            "elapsed": round(elapsed, 3),
+        }
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(exchange, ensure_ascii=False) + "\n")
+
+    def play(self, method, url):
+        """
+        Get the next recorded exchange for a request, after its scaled latency.
+
+        Raises:
+            CassetteError: If no recorded exchange is left for the request
+        """
+        key = (method, redact_url(url))
+        with self._lock:
+            if not self._exchanges[key]:
+                raise CassetteError(f"No recorded response left for {method} {key[1]}")
+            exchange = self._exchanges[key].popleft()
+        if self.speed:
+            time.sleep(exchange["elapsed"] * self.speed)
+        return exchange
+
+class CassetteAdapter(HTTPAdapter):
+    """requests transport adapter that records to or replays from a cassette"""
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == "replay":
+            exchange = self.cassette.play(request.method, request.url)
+            response = requests.Response()
+            response.status_code = exchange["status"]
+            response.headers["Content-Type"] = exchange["content_type"]
+            response._content = exchange["body"].encode("utf-8")
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+
+        started_at = time.monotonic()
+        response = super().send(request, **kwargs)
+        self.cassette.record(
+            request.method, request.url, request.body, response.status_code,
+            response.headers.get("Content-Type", ""), response.text, time.monotonic() - started_at
+        )
+        return response
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport, used by the OpenAI client, that records to or replays from a cassette"""
+    def __init__(self, cassette):
+        self.cassette = cassette
+        self._transport = httpx.HTTPTransport() if cassette.mode == "record" else None
+
+    def handle_request(self, request):
+        if self.cassette.mode == "replay":
+            exchange = self.cassette.play(request.method, str(request.url))
+            return httpx.Response(
+                exchange["status"],
+                headers={"Content-Type": exchange["content_type"]},
+                content=exchange["body"].encode("utf-8"),
+                request=request
+            )
+
+        started_at = time.monotonic()
+        response = self._transport.handle_request(request)
+        content = response.read()
+        self.cassette.record(
+            request.method, str(request.url), request.content, response.status_code,
+            response.headers.get("Content-Type", ""), content.decode("utf-8", errors="replace"),
+            time.monotonic() - started_at
+        )
+        # The content is already decoded, so drop the headers describing the wire encoding
+        headers = [
+            (key, value) for key, value in response.headers.items()
+            if key.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        if self._transport:
+            self._transport.close()
@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class _Call:
+    """An in-flight call that concurrent callers with the same key wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one, and cache results for a TTL.
+    
+    The first caller for a key runs the function; callers arriving while it runs
+    wait and share its result (or exception). Successful results are served from
+    the cache until they are ttl seconds old. Failures are never cached.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._cache = {}
+    
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers with the same key.
+        
+        Args:
+            key: Identifies calls that can share a result
+            fn: Function with no arguments that computes the result
+            
+        Returns:
+            tuple: (result, source) where source is "computed", "shared" or "cached"
+            
+        Raises:
+            Any exception raised by fn, re-raised in every waiting caller
+        """
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1], "cached"
+            
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                leader = False
+        
+        if not leader:
+            logger.info(f"Joining in-flight call for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, "shared"
+        
+        try:
+            call.result = fn()
+            with self._lock:
+                self._cache[key] = (time.monotonic() + self.ttl, call.result)
+            return call.result, "computed"
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._evict_expired()
+            call.done.set()
+    
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
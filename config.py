@@ -3,10 +3,16 @@ Configuration file for Info Ranger queries and schedules.
 Users can easily modify this file to add, remove, or change queries and their frequency.
 """
 
+import atexit
+import os
+import shutil
+import tempfile
+
 # Query configurations
 # Format: Each query is a dictionary with 'title' and 'description' keys
-# The description can include date placeholders: {today}, {yesterday}, {from_last_week}, {from_last_month}
+# The description can include date placeholders: {today}, {yesterday}, {from_last_week}, {from_last_month}, {since_last_run}
 # These will be automatically replaced with the appropriate dates when the query runs
+# {since_last_run} covers exactly the time since the query was last delivered successfully
 
 # Daily queries - Run every day
 DAILY_QUERIES = [
@@ -27,6 +33,15 @@ WEEKLY_QUERIES = [
         "title": "Energy and Climate Change",
         "description": "Get the top news related to Energy and Climate Change {from_last_week}. Be descriptive in the news description. Focus on the major events, trends, businesses, and macro-economic happenings that could be useful for an investor. Focus on India and US demographics. Include the date in which the news got published in the description. Don't include any news outside the date frame in the prompt."
     },
+    # Example of a rollup query, built from stored daily results instead of new research
+    # {
+    #     "title": "Week in Review",
+    #     "description": "The most important news {from_last_week}.",
+    #     "rollup": {
+    #         "tags": ["Current Affairs"],  # Titles (or custom query names) of the queries to roll up
+    #         "gap_fill": True  # Make a small research call for news the stored results missed
+    #     }
+    # },
     # Add more weekly queries here
 ]
 
@@ -54,7 +69,8 @@ CUSTOM_QUERIES = [
         "name": "crypto_updates",
         "title": "Cryptocurrency Updates",
         "description": "Get the latest cryptocurrency market updates and news {from_last_week}. Focus on Bitcoin, Ethereum, and other major cryptocurrencies.",
-        "cron": "cron(0 15 ? * MON,THU *)"  # Run every Monday and Thursday at 15:00 UTC
+        "cron": "cron(0 15 ? * MON,THU *)",  # Run every Monday and Thursday at 15:00 UTC
+        # "model_policy": {"tier": "standard", "latency_slo": 60, "max_cost": 0.05}  # See "Model tiering" below
     },
     # Add more custom queries here as needed
 ]
@@ -80,6 +96,174 @@ Description 2
 
 MAX_RETRIES = 3
 
+# State - local state files live in STATE_DIR. Lambda's code directory is read-only, so there it defaults
+# to /tmp, which only lasts as long as the container. Set STATE_BUCKET to keep the run history, results
+# store, link cache and archive in S3 instead (under STATE_PREFIX), shared by every function and invocation.
+# Cassette replays always start from empty state in a throwaway directory, so they replay the same way
+# every time and never touch real state.
+REPLAYING = os.getenv("CASSETTE_MODE") == "replay"
+STATE_DIR = (
+    tempfile.mkdtemp(prefix="info-ranger-replay-") if REPLAYING
+    else os.getenv("STATE_DIR", "/tmp" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "")
+)
+if REPLAYING:
+    atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+STATE_BUCKET = None if REPLAYING else os.getenv("STATE_BUCKET")
+STATE_PREFIX = os.getenv("STATE_PREFIX", "state/")
+
+def state_file(variable, name):
+    """Path of a state file: the environment variable if set, else name in STATE_DIR (always STATE_DIR in replays)"""
+    default = os.path.join(STATE_DIR, name)
+    return default if REPLAYING else os.getenv(variable, default)
+
+# Run history - per-query durations and outcomes recorded by every run
+RUN_HISTORY_FILE = state_file("RUN_HISTORY_FILE", "run_history.json")
+MAX_RECORDED_DURATIONS = 20
+
+# Custom function packing - used by generate_serverless_config.py to group
+# custom queries that share a cron schedule into as few Lambda functions as possible
+LAMBDA_TIMEOUT = 900  # Seconds
+PACKING_SAFETY_MARGIN = 0.8  # Fraction of the timeout a packed function may use
+OUTLIER_FRACTION = 0.5  # Queries slower than this fraction of the usable time get their own function
+DEFAULT_QUERY_DURATION = 180  # Seconds, assumed for queries with no recorded runs
+
+# Digest size caps - the best items (by relevance to the query and recency) are kept.
+# Override per query with "max_items" and "max_parts" keys; None means no limit.
+DEFAULT_MAX_ITEMS = 15
+DEFAULT_MAX_PARTS = 3
+RANKING_RECENCY_WEIGHT = 0.3  # Share of an item's score that comes from recency
+RANKING_RECENCY_HALF_LIFE_DAYS = 3
+
+# Results store - validated news items kept for weekly and monthly rollups
+RESULTS_STORE_FILE = state_file("RESULTS_STORE_FILE", "results_store.json")
+RESULTS_RETENTION_DAYS = 40
+ROLLUP_MAX_ITEMS = 12
+ROLLUP_GAP_FILL_MODEL = "sonar"  # Cheaper model for the small gap-filling research call
+
+# Archive - every delivered digest is indexed in this SQLite database for full-text search
+# (kept in STATE_BUCKET when set, and downloaded for each update and search)
+ARCHIVE_FILE = state_file("ARCHIVE_FILE", "archive.db")
+
+# Subscriptions - deliver a query's digest to several Telegram chats from a single research run
+# Keys are query titles (or names, for custom queries). Queries without an entry go to TELEGRAM_CHANNEL_ID.
+# Per-chat options: "include_links" (bool) and "max_items_per_category" (int)
+SUBSCRIPTIONS = {
+    # "Current Affairs": [
+    #     {"chat_id": "-1001234567890"},
+    #     {"chat_id": "-1009876543210", "options": {"include_links": False, "max_items_per_category": 3}},
+    # ],
+}
+
+# Telegram delivery limits shared by all chats of a broadcast
+TELEGRAM_MAX_CONCURRENCY = 8
+TELEGRAM_MESSAGES_PER_SECOND = 25  # Telegram allows about 30 per second per bot
+TELEGRAM_CHAT_INTERVAL = 1.0  # Seconds between messages to the same chat
+
+# On-demand research endpoint
+RESEARCH_CACHE_TTL = 900  # Seconds a digest is served from cache to repeat requests
+ENDPOINT_TOKEN = os.getenv("ENDPOINT_TOKEN")  # Requests need "Authorization: Bearer <token>"; unset disables the endpoint
+
+# Record/replay of API traffic - "record" writes every Perplexity, OpenAI and Telegram
+# exchange to CASSETTE_FILE, "replay" serves them back offline. Unset for normal runs.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE")
+CASSETTE_FILE = os.getenv("CASSETTE_FILE", "cassette.jsonl")
+CASSETTE_SPEED = float(os.getenv("CASSETTE_SPEED", "0"))  # Replay latency scale: 0 none, 1 original
+
+# Profiling - set PROFILING=1 to profile CPU time and memory of each pipeline stage.
+# Summaries are logged; profiles are also written to PROFILE_DIR and/or uploaded to PROFILE_S3_BUCKET.
+PROFILING = os.getenv("PROFILING", "").lower() in ("1", "true", "yes")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "15"))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_S3_BUCKET = os.getenv("PROFILE_S3_BUCKET")
+
+# Logging of large payloads (full API responses and messages)
+# LOG_FULL_PAYLOADS=1 logs them in full, for debugging; otherwise they are cut to LOG_PAYLOAD_MAX_CHARS.
+# LOG_SAMPLE_RATES sets the fraction of payload logs kept per category, e.g. "completion=0.1,research=0.5"
+LOG_FULL_PAYLOADS = os.getenv("LOG_FULL_PAYLOADS", "").lower() in ("1", "true", "yes")
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+LOG_SAMPLE_RATES = {
+    category.strip(): float(rate)
+    for category, rate in (
+        item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item
+    )
+}
+
+# AI providers per pipeline role, tried healthiest first with failover.
+# Health is an EWMA of each provider's latency and error rate; a provider's first model is its default.
+# Types: "perplexity" and "openai", and "fake" (options: latency, jitter, failure_rate, content) for offline runs.
+PROVIDERS = {
+    "research": [
+        {"name": "perplexity", "type": "perplexity", "models": [MODEL, "sonar-pro", "sonar"]},
+        # {"name": "perplexity-fallback", "type": "perplexity", "models": ["sonar-pro"]},
+    ],
+    "formatting": [
+        {"name": "openai", "type": "openai", "models": [FORMATTING_MODEL, "gpt-4o-mini"]},
+        # {"name": "openai-mini", "type": "openai", "models": ["gpt-4o-mini"]},
+    ],
+}
+PROVIDER_EWMA_ALPHA = 0.3  # Weight of the newest call in a provider's health
+PROVIDER_EXPECTED_LATENCY = 30.0  # Assumed latency in seconds of a provider without calls yet
+PROVIDER_RECOVERY_SECONDS = 600  # A provider's errors are forgotten after this long without calls
+
+# Quota governor - requests and tokens per minute for each provider (or "provider:model"), shared by every
+# invocation so overlapping schedules queue instead of hitting 429s. Set these to your account's limits;
+# "burst" caps how many requests can go out at once. Providers without an entry aren't limited.
+QUOTAS = {
+    "perplexity": {"requests_per_minute": 50},
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 30000},
+    # "openai:gpt-4o-mini": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+}
+# Buckets live in the DynamoDB table QUOTA_TABLE (string partition key "key", created by serverless.yml) if set,
+# else in the SQLite file QUOTA_FILE, which is only shared by processes on the same machine. If the backend
+# can't be reached, calls go ahead ungoverned.
+QUOTA_TABLE = None if REPLAYING else os.getenv("QUOTA_TABLE")
+QUOTA_FILE = state_file("QUOTA_FILE", "quota.db")
+QUOTA_MAX_WAIT = 120  # Seconds a call may queue for quota before failing over to the next provider
+QUOTA_DEFAULT_OUTPUT_TOKENS = 1500  # Completion tokens assumed for models without recorded usage
+
+# Model tiering - a query's "model_policy" picks the cheapest model that meets it:
+#   "tier": minimum quality tier ("economy", "standard" or "premium"); without one, MODEL / FORMATTING_MODEL are used
+#   "latency_slo": seconds each model call may be expected to take
+#   "max_cost": dollars each model call may be expected to cost
+# Expected latency and output tokens come from recorded calls, falling back to the catalog values below.
+QUALITY_TIERS = {"economy": 1, "standard": 2, "premium": 3}
+# Prices in dollars per million tokens, plus any per-request fee; check your providers' current pricing
+MODEL_CATALOG = {
+    "research": {
+        "sonar": {"tier": "economy", "input_price": 1.0, "output_price": 1.0, "request_price": 0.005, "latency": 15, "output_tokens": 1200},
+        "sonar-pro": {"tier": "standard", "input_price": 3.0, "output_price": 15.0, "request_price": 0.006, "latency": 30, "output_tokens": 1500},
+        "sonar-reasoning-pro": {"tier": "premium", "input_price": 2.0, "output_price": 8.0, "request_price": 0.006, "latency": 90, "output_tokens": 3000},
+    },
+    "formatting": {
+        "gpt-4o-mini": {"tier": "economy", "input_price": 0.15, "output_price": 0.6, "request_price": 0.0, "latency": 15, "output_tokens": 1500},
+        "gpt-4o": {"tier": "premium", "input_price": 2.5, "output_price": 10.0, "request_price": 0.0, "latency": 20, "output_tokens": 1500},
+    },
+}
+# Estimated monthly model spend in dollars; past BUDGET_DOWNGRADE_AT of it queries drop one tier,
+# and once it is spent they use the cheapest tier. Unset for no budget.
+MONTHLY_BUDGET = float(os.getenv("MONTHLY_BUDGET")) if os.getenv("MONTHLY_BUDGET") else None
+BUDGET_DOWNGRADE_AT = 0.8
+# Fraction of the Lambda invocation's remaining time a model call may be expected to take
+MODEL_DEADLINE_SHARE = {"research": 0.6, "formatting": 0.8}
+
+# Citation links - tracking parameters (utm_*, fbclid, gclid, ...) are always stripped and duplicates listed once.
+# With LINK_RESOLVE=1 redirects are also followed and dead links dropped, checking links concurrently;
+# results are cached in LINK_CACHE_FILE (STATE_BUCKET when set) for LINK_CACHE_TTL seconds (LINK_DEAD_CACHE_TTL for dead
+# or inconclusive links).
+LINK_RESOLVE = os.getenv("LINK_RESOLVE", "").lower() in ("1", "true", "yes")
+LINK_CACHE_FILE = state_file("LINK_CACHE_FILE", "link_cache.json")
+LINK_CACHE_TTL = 7 * 24 * 3600
+LINK_DEAD_CACHE_TTL = 24 * 3600
+LINK_RESOLVE_CONCURRENCY = 16
+LINK_RESOLVE_TIMEOUT = 5.0  # Seconds per request
+
+# Window used by {since_last_run} when a query has never been delivered, in days
+SINCE_LAST_RUN_FALLBACK_DAYS = {
+    "daily": 1,
+    "weekly": 8,
+    "monthly": 32,
+    "custom": 8,
+}
 
 
 # Configuration validation
@@ -107,6 +291,33 @@ def validate_query_config(query, query_type):
         print(f"Error: {query_type} query missing 'description' field")
         return False
         
+    # Rollup queries need the tags of the queries they roll up
+    if 'rollup' in query:
+        rollup = query['rollup']
+        if not isinstance(rollup, dict) or not isinstance(rollup.get('tags'), list) or not rollup['tags']:
+            print(f"Error: {query_type} query 'rollup' must be a dictionary with a non-empty 'tags' list")
+            return False
+        
+    # Model policies need a known tier and positive limits
+    if 'model_policy' in query:
+        policy = query['model_policy']
+        if not isinstance(policy, dict):
+            print(f"Error: {query_type} query 'model_policy' must be a dictionary")
+            return False
+        if policy.get('tier') is not None and policy['tier'] not in QUALITY_TIERS:
+            print(f"Error: {query_type} query model tier must be one of {', '.join(QUALITY_TIERS)}")
+            return False
+        for limit in ('latency_slo', 'max_cost'):
+            if policy.get(limit) is not None and (not isinstance(policy[limit], (int, float)) or policy[limit] <= 0):
+                print(f"Error: {query_type} query '{limit}' must be a positive number")
+                return False
+        
+    # Digest size caps must be positive integers
+    for cap in ('max_items', 'max_parts'):
+        if cap in query and query[cap] is not None and (not isinstance(query[cap], int) or query[cap] < 1):
+            print(f"Error: {query_type} query '{cap}' must be a positive integer")
+            return False
+        
     # For custom queries, check additional required fields
     if query_type == 'custom':
         if 'name' not in query:
@@ -159,6 +370,43 @@ def validate_all_configs():
     
     return all_valid
 
+def validate_cassette_config():
+    """
+    Validate the record/replay configuration.
+    
+    Returns:
+        bool: True if valid, False otherwise
+    """
+    if CASSETTE_MODE not in (None, "", "record", "replay"):
+        print(f"Error: CASSETTE_MODE must be 'record' or 'replay', not '{CASSETTE_MODE}'")
+        return False
+    return True
+
+def validate_provider_config():
+    """
+    Validate the AI provider registry.
+    
+    Returns:
+        bool: True if valid, False otherwise
+    """
+    all_valid = True
+    for role in ("research", "formatting"):
+        providers = PROVIDERS.get(role)
+        if not providers:
+            print(f"Error: PROVIDERS needs at least one '{role}' provider")
+            all_valid = False
+            continue
+        for provider in providers:
+            if provider.get("type") not in ("perplexity", "openai", "fake"):
+                print(f"Error: {role} provider '{provider.get('name')}' has unknown type '{provider.get('type')}'")
+                all_valid = False
+            if not provider.get("name") or not provider.get("models"):
+                print(f"Error: {role} provider needs a 'name' and a non-empty 'models' list: {provider}")
+                all_valid = False
+    return all_valid
+
 # Validate configurations when module is imported
 if __name__ != "__main__":
-    validate_all_configs() 
\ No newline at end of file
+    validate_all_configs()
+    validate_cassette_config()
+    validate_provider_config() 
\ No newline at end of file
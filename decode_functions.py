@@ -0,0 +1,59 @@
+import json
+import logging
+from functools import lru_cache
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from news_models import NewsResponse
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class DecodeError(Exception):
+    """Custom exception for errors decoding formatter output"""
+    pass
+
+@lru_cache(maxsize=None)
+def get_type_adapter(schema):
+    """
+    Get the compiled validator for a schema, building it only once per process.
+    
+    Args:
+        schema: The pydantic model or type to validate against
+        
+    Returns:
+        TypeAdapter: The cached validator
+    """
+    return TypeAdapter(schema)
+
+def decode_news_response(data, schema=NewsResponse):
+    """
+    Decode formatter output into validated news records.
+    
+    JSON text is parsed with json.loads and then validated by the cached adapter;
+    on formatter-sized output that is faster than pydantic's own JSON parser
+    (see benchmarks/bench_decode.py).
+    
+    Args:
+        data: JSON str or bytes, a parsed dict, or an already validated model
+        schema: The pydantic model to validate against (default NewsResponse)
+        
+    Returns:
+        The validated model instance
+        
+    Raises:
+        DecodeError: If the data isn't valid for the schema
+    """
+    if isinstance(data, schema):
+        return data
+    
+    adapter = get_type_adapter(schema)
+    try:
+        if isinstance(data, (str, bytes, bytearray)):
+            return adapter.validate_python(json.loads(data))
+        if isinstance(data, BaseModel):
+            data = data.model_dump()
+        return adapter.validate_python(data)
+    except json.JSONDecodeError as e:
+        raise DecodeError(f"Invalid JSON: {str(e)}")
+    except ValidationError as e:
+        raise DecodeError(f"Invalid {schema.__name__} data: {e.error_count()} errors, first: {e.errors()[0]['msg']}")
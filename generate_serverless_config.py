@@ -2,15 +2,150 @@
 """
 Script to generate serverless.yml configuration for custom queries.
 This helps users easily add their own custom queries with custom schedules.
+
+Custom queries that share a cron schedule are packed into as few Lambda functions
+as possible, using the durations recorded in the run history (or a benchmark file)
+to keep every function well inside the Lambda timeout.
 """
 
+import argparse
 import sys
 import yaml
-from config import CUSTOM_QUERIES
+from config import (
+    CUSTOM_QUERIES, RUN_HISTORY_FILE, LAMBDA_TIMEOUT, PACKING_SAFETY_MARGIN,
+    OUTLIER_FRACTION, DEFAULT_QUERY_DURATION
+)
+from history_functions import load_run_history, get_query_durations
+from json_functions import read_json, JSONProcessingError
+
+BATCH_HANDLER = 'handler.custom_research_batch'
+
+CRON_NAMES = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12,
+    'SUN': 1, 'MON': 2, 'TUE': 3, 'WED': 4, 'THU': 5, 'FRI': 6, 'SAT': 7,
+}
+
+def load_durations(history_file, benchmark_file=None):
+    """
+    Load the estimated duration of every custom query.
+
+    Durations from the benchmark file (a JSON object of query name to seconds)
+    take precedence over the run history. The worst recorded run is used as the estimate.
+
+    Args:
+        history_file: The run history file
+        benchmark_file: Optional benchmark file
+
+    Returns:
+        dict: Mapping of query name to estimated duration in seconds
+    """
+    durations = {
+        key: max(values)
+        for key, values in get_query_durations(load_run_history(history_file)).items()
+    }
+
+    if benchmark_file:
+        try:
+            benchmark = read_json(benchmark_file)
+        except JSONProcessingError as e:
+            print(f"Error: could not read benchmark file: {str(e)}")
+            sys.exit(1)
+        for key, value in benchmark.items():
+            durations[key] = max(value) if isinstance(value, list) else value
+
+    return durations
+
+def pack_queries(queries, durations, capacity):
+    """
+    Pack queries into as few bins as possible without exceeding the capacity.
 
-def generate_serverless_config():
+    Slow outliers get a bin of their own; the rest are packed first-fit decreasing.
+    Queries keep their configured order within a bin.
+
+    Args:
+        queries: Custom queries sharing a schedule
+        durations: Mapping of query name to estimated duration in seconds
+        capacity: The usable time of a single function, in seconds
+
+    Returns:
+        list: Bins, each a list of queries
+    """
+    def estimate(query):
+        return durations.get(query['name'], DEFAULT_QUERY_DURATION)
+
+    order = {query['name']: i for i, query in enumerate(queries)}
+    bins = []
+    loads = []
+
+    for query in sorted(queries, key=estimate, reverse=True):
+        duration = estimate(query)
+        if duration > capacity * OUTLIER_FRACTION:
+            bins.append([query])
+            loads.append(capacity)  # Nothing else goes into an outlier's function
+            continue
+
+        for i, load in enumerate(loads):
+            if load + duration <= capacity:
+                bins[i].append(query)
+                loads[i] += duration
+                break
+        else:
+            bins.append([query])
+            loads.append(duration)
+
+    bins = [sorted(queries_in_bin, key=lambda query: order[query['name']]) for queries_in_bin in bins]
+    return sorted(bins, key=lambda queries_in_bin: order[queries_in_bin[0]['name']])
+
+def count_cron_values(field, low, high):
+    """Count the values a single AWS cron field matches"""
+    if field in ('*', '?'):
+        return high - low + 1
+
+    count = 0
+    for part in field.split(','):
+        if any(marker in part for marker in ('L', 'W', '#')):
+            count += 1
+            continue
+
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (CRON_NAMES.get(value, None) or int(value) for value in part.split('-'))
+        else:
+            start = CRON_NAMES.get(part, None) or int(part)
+            end = high if step > 1 else start
+        count += len(range(start, end + 1, step))
+    return count
+
+def estimate_monthly_invocations(cron):
+    """
+    Estimate how many times a month an AWS cron schedule fires.
+
+    Args:
+        cron: A schedule expression such as "cron(0 12 ? * WED *)"
+
+    Returns:
+        float: The average number of invocations per month
+    """
+    minutes, hours, day_of_month, month, day_of_week, _ = cron.strip()[len('cron('):-1].split()
+
+    per_day = count_cron_values(minutes, 0, 59) * count_cron_values(hours, 0, 23)
+    if day_of_week != '?':
+        days = count_cron_values(day_of_week, 1, 7) * 30.44 / 7
+    elif day_of_month == '*':
+        days = 30.44
+    else:
+        days = count_cron_values(day_of_month, 1, 31)
+    months = count_cron_values(month, 1, 12) / 12
+
+    return per_day * days * months
+
+def generate_serverless_config(history_file=RUN_HISTORY_FILE, benchmark_file=None):
     """Generate serverless.yml configuration with custom queries"""
-    
+
     # Load existing serverless.yml
     try:
         with open('serverless.yml', 'r') as file:
@@ -18,39 +153,74 @@ def generate_serverless_config():
     except FileNotFoundError:
         print("Error: serverless.yml not found. Make sure you're in the project root directory.")
         sys.exit(1)
-    
+
     # Check if there are any custom queries
     if not CUSTOM_QUERIES:
         print("No custom queries found in config.py. Add some queries to CUSTOM_QUERIES first.")
         return
-    
-    # Add custom queries to functions
+
+    # Remove previously generated custom functions so the packing can change between runs
+    custom_names = {query['name'] for query in CUSTOM_QUERIES}
+    functions = config.setdefault('functions', {})
+    for function_name in list(functions):
+        if function_name in custom_names or functions[function_name].get('handler') == BATCH_HANDLER:
+            del functions[function_name]
+
+    durations = load_durations(history_file, benchmark_file)
+    capacity = LAMBDA_TIMEOUT * PACKING_SAFETY_MARGIN
+
+    # Group custom queries by schedule, keeping the configured order
+    schedules = {}
     for query in CUSTOM_QUERIES:
-        function_name = query["name"]
-        
-        # Skip if function already exists
-        if function_name in config.get('functions', {}):
-            print(f"Function '{function_name}' already exists in serverless.yml. Skipping.")
-            continue
-        
-        # Add function configuration
-        config['functions'][function_name] = {
-            'handler': f'handler.{function_name}',
-            'timeout': 900,
-            'events': [
-                {'schedule': query['cron']}
-            ]
-        }
-        
-        print(f"Added function '{function_name}' with schedule: {query['cron']}")
-    
+        schedules.setdefault(query['cron'], []).append(query)
+
+    for cron, queries in schedules.items():
+        invocations = estimate_monthly_invocations(cron)
+        bins = pack_queries(queries, durations, capacity)
+        print(f"\nSchedule {cron}: {len(queries)} queries packed into {len(bins)} function(s)")
+
+        for queries_in_bin in bins:
+            names = [query['name'] for query in queries_in_bin]
+            if len(queries_in_bin) == 1:
+                function_name = names[0]
+                config['functions'][function_name] = {
+                    'handler': f'handler.{function_name}',
+                    'timeout': LAMBDA_TIMEOUT,
+                    'events': [
+                        {'schedule': cron}
+                    ]
+                }
+            else:
+                function_name = f"{names[0]}_batch"
+                config['functions'][function_name] = {
+                    'handler': BATCH_HANDLER,
+                    'timeout': LAMBDA_TIMEOUT,
+                    'events': [
+                        {'schedule': {'rate': cron, 'input': {'queries': names}}}
+                    ]
+                }
+
+            worst_case = sum(durations.get(name, DEFAULT_QUERY_DURATION) for name in names)
+            estimated = [name for name in names if name not in durations]
+            print(f"  Added function '{function_name}': {', '.join(names)}")
+            print(f"    Expected invocations: ~{invocations:.0f}/month, worst-case duration: {worst_case:.0f}s of {LAMBDA_TIMEOUT}s")
+            if estimated:
+                print(f"    No recorded duration for {', '.join(estimated)}; assumed {DEFAULT_QUERY_DURATION}s each")
+            if worst_case > LAMBDA_TIMEOUT:
+                print(f"    Warning: '{function_name}' may exceed the Lambda timeout")
+
     # Write updated configuration back to serverless.yml
     with open('serverless.yml', 'w') as file:
         yaml.dump(config, file, default_flow_style=False)
-    
+
     print("\nServerless configuration updated successfully!")
     print("To deploy your changes, run: serverless deploy")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate serverless.yml functions for custom queries")
+    parser.add_argument('--history', default=RUN_HISTORY_FILE, help="Run history file with recorded query durations")
+    parser.add_argument('--benchmark', help="JSON file mapping custom query names to durations in seconds")
+    args = parser.parse_args()
+
     print("Generating serverless configuration for custom queries...")
-    generate_serverless_config() 
\ No newline at end of file
+    generate_serverless_config(args.history, args.benchmark)
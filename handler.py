@@ -1,17 +1,37 @@
 import datetime
 import logging
 from message_functions import construct_search_url, MessageFormattingError
-from ai_functions import chat_completion_pplx, PerplexityAPIError, chat_completion_openai, OpenAIAPIError
+from ai_functions import ProviderError
+from provider_functions import get_router
+from tier_functions import select_model, get_model_policy, get_deadline
 from telegram_functions import send_message_telegram, TelegramAPIError
+from history_functions import get_query_key, record_query_run, get_last_success
+from results_functions import store_news_response, ResultsStoreError
+from archive_functions import archive_news_response, ArchiveError
+from rollup_functions import build_rollup_response, build_gap_fill_prompt, merge_news_responses
+from coalesce_functions import SingleFlight
+from decode_functions import decode_news_response, DecodeError
+from ranking_functions import trim_news_response
+from link_functions import clean_citations, clean_news_links
+from sanitize_functions import sanitize_digest, escape_html
+from render_functions import render_news_blocks, pack_blocks, split_html
+from log_functions import log_payload
+from profiling_functions import profile_handler, profile_stage
+from broadcast_functions import broadcast_digest, get_subscribers, raise_if_undelivered
 import asyncio
 from config import (
     DAILY_QUERIES, WEEKLY_QUERIES, MONTHLY_QUERIES, CUSTOM_QUERIES, 
-    MODEL, SYSTEM_MESSAGE, FORMATTING_MODEL, MAX_RETRIES,
+    MODEL, SYSTEM_MESSAGE, FORMATTING_MODEL, MAX_RETRIES, SINCE_LAST_RUN_FALLBACK_DAYS,
+    ROLLUP_GAP_FILL_MODEL, RESEARCH_CACHE_TTL, ENDPOINT_TOKEN, DEFAULT_MAX_ITEMS, DEFAULT_MAX_PARTS,
     validate_query_config
 )
-from pydantic import BaseModel, Field, TypeAdapter
-from typing import List
+from news_models import NewsItem, NewsCategory, NewsResponse
 import json
+import time
+import base64
+import hashlib
+import hmac
+from urllib.parse import parse_qs
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -28,52 +48,42 @@ daily_queries = DAILY_QUERIES
 weekly_queries = WEEKLY_QUERIES
 monthly_queries = MONTHLY_QUERIES
 
-class NewsItem(BaseModel):
-    """
-    Represents a single news item with title, description, and source link.
-    
-    This model is used to structure news data retrieved from AI services before
-    formatting and sending to Telegram. Each news item represents one piece of news
-    that will be displayed to the user.
-    """
-    title: str = Field(
-        description="The headline or title of the news item"
-    )
-    description: str = Field(
-        description="The main content or body of the news item containing details and context"
-    )
-    link: str = Field(
-        description="URL pointing to the source or original article"
-    )
-
-class NewsCategory(BaseModel):
-    category: str = Field(
-        description="The category of the news item"
-    )
-    news_items: List[NewsItem] = Field(
-        description="A list of news items"
-    )
-
-class NewsResponse(BaseModel):
-    news_items: List[NewsCategory] = Field(
-        description="A list of categorized news items"
-    )
+# Shared by all on-demand requests handled by this process
+research_flight = SingleFlight(RESEARCH_CACHE_TTL)
 
 def calculate_past_date(days):
     return (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%b %d, %Y")
 
-def parse_date_keys_to_dates(description):
-    today = datetime.datetime.now().strftime("%b %d, %Y")
+def parse_date_keys_to_dates(description, last_success=None, fallback_days=1, now=None):
+    """
+    Replace the date placeholders in a query description.
+    
+    Args:
+        description: The query description
+        last_success: Time of the query's last successful delivery, used by {since_last_run}
+        fallback_days: Window used by {since_last_run} when there is no last_success
+        now: The time the windows end at (defaults to now)
+        
+    Returns:
+        str: The description with all placeholders replaced
+    """
+    now = now or datetime.datetime.now()
+    today = now.strftime("%b %d, %Y")
     yesterday = calculate_past_date(1)
     from_last_week = f"from {calculate_past_date(8)} to {today}"
     from_last_month = f"from {calculate_past_date(32)} to {today}"
+    if last_success:
+        since_last_run = f"from {last_success.strftime('%b %d, %Y %H:%M')} to {now.strftime('%b %d, %Y %H:%M')}"
+    else:
+        since_last_run = f"from {calculate_past_date(fallback_days)} to {today}"
 
     # Dictionary to map placeholders to their corresponding date values
     date_replacements = {
         "{today}": today,
         "{yesterday}": yesterday,
         "{from_last_week}": from_last_week,
-        "{from_last_month}": from_last_month
+        "{from_last_month}": from_last_month,
+        "{since_last_run}": since_last_run
     }
 
     # Replace the placeholders in the description
@@ -83,31 +93,69 @@ def parse_date_keys_to_dates(description):
     return description
 
 
-def get_formatted_json_with_ai(content, response_format):
+def resolve_query(query, query_type="custom", now=None):
+    """
+    Fill in the date placeholders of a query, returning a new query configuration.
+    
+    Args:
+        query: The query configuration
+        query_type: Type of query, used for the {since_last_run} fallback window
+        now: The time the date windows end at (defaults to now)
+        
+    Returns:
+        dict: A copy of the query with dates filled in
+    """
+    query = dict(query)
+    if "{since_last_run}" in query["description"]:
+        last_success = get_last_success(get_query_key(query))
+    else:
+        last_success = None
+    query["description"] = parse_date_keys_to_dates(
+        query["description"], last_success, SINCE_LAST_RUN_FALLBACK_DAYS.get(query_type, 1), now
+    )
+    return query
+
+def choose_model(role, query, prompt, deadline=None, choices=None):
+    """
+    Choose the model for a research or formatting call under the query's model policy.
+    
+    Args:
+        role: "research" or "formatting"
+        query: The query configuration
+        prompt: The full prompt text of the call
+        deadline: Monotonic time by which the invocation must finish, if any
+        choices: Optional dict the choice is reported in, by role
+        
+    Returns:
+        str: The chosen model
+    """
+    choice = select_model(role, get_model_policy(query), prompt, deadline)
+    logger.info(f"Chose {role} model {choice['model']} (tier {choice['tier']}) for '{query['title']}': {choice['reason']}")
+    if choices is not None:
+        choices[role] = choice
+    return choice["model"]
+
+def get_formatted_json_with_ai(content, response_format, model=None):
     """
-    Format the news content in the given json format using the configured formatting model.
+    Format the news content in the given json format using the formatting model (the configured one by default).
     """
     try:
-        completion = chat_completion_openai(
-            model=formatting_model,
+        completion = get_router("formatting").call(
             system_message="Format the content in the given json format",
             user_message=content,
-            response_format=response_format
+            response_format=response_format,
+            model=model or formatting_model
         )
 
-        logger.info(f"Completion:\n\n{completion}")
+        log_payload(logger, logging.INFO, "Completion", completion, "completion")
         
-        # If completion is a string (JSON), parse it directly
+        # If completion is a string (JSON), validate it directly
         if isinstance(completion, str):
             try:
-                parsed_json = json.loads(completion)        
-                # Use TypeAdapter to validate and convert to NewsResponse
-                response_adapter = TypeAdapter(response_format)
-                response = response_adapter.validate_python(parsed_json)
-                
+                response = decode_news_response(completion, response_format)
                 logger.info(f"Successfully parsed JSON string into NewsResponse with {len(response.news_items)} items")
                 return response
-            except Exception as e:
+            except DecodeError as e:
                 logger.error(f"Error parsing JSON string: {str(e)}")
                 # Return the original string if parsing fails
                 return completion
@@ -117,7 +165,7 @@ def get_formatted_json_with_ai(content, response_format):
             logger.info(f"Received object response with parsed message")
             return response
             
-    except OpenAIAPIError as e:
+    except ProviderError as e:
         logger.error(f"Error formatting content with AI: {str(e)}")
         return content
     except Exception as e:
@@ -126,15 +174,175 @@ def get_formatted_json_with_ai(content, response_format):
     
 
 
+def research_query(query, message, research_model=None, deadline=None, choices=None):
+    """
+    Research a query with the research providers and format the result with the formatting providers.
+    
+    Args:
+        query: The query configuration, with dates already filled in
+        message: The message header the research content is appended to
+        research_model: The research model to use (chosen by the query's model policy if None)
+        deadline: Monotonic time by which the invocation must finish, if any
+        choices: Optional dict the chosen models are reported in, by role
+        
+    Returns:
+        The formatted NewsResponse, or the unformatted content if formatting fails
+        
+    Raises:
+        ProviderError: If every research provider fails
+    """
+    if research_model is None:
+        research_model = choose_model("research", query, system_message + query['description'], deadline, choices)
+    elif choices is not None:
+        choices["research"] = {"model": research_model, "tier": None, "reason": "fixed model"}
+    
+    # Get response from AI
+    with profile_stage("research"):
+        news_response = get_router("research").call(system_message, query['description'], model=research_model)
+    news_content = news_response['choices'][0]['message']['content']
+    # Strip tracking parameters, duplicates and (if enabled) dead links from the citations
+    with profile_stage("links"):
+        citations = clean_citations(news_response.get('citations', []))
+
+    # Format message with citations, keeping the numbers the research text refers to
+    unformatted_message = message + f"{news_content}\n\n"
+    if citations:
+        unformatted_message += "<b>Links:</b>\n"
+        for numbers, citation in citations:
+            unformatted_message += "".join(f"[{number}]" for number in numbers) + f" {citation}\n"
+
+    log_payload(logger, logging.INFO, "Unformatted message", unformatted_message, "research")
+
+    # Get formatted JSON response
+    formatting_choice = choose_model("formatting", query, unformatted_message, deadline, choices)
+    with profile_stage("format"):
+        formatted_json = get_formatted_json_with_ai(unformatted_message, NewsResponse, formatting_choice)
+    
+    if isinstance(formatted_json, NewsResponse):
+        with profile_stage("links"):
+            formatted_json = clean_news_links(formatted_json)
+    return formatted_json
+
+def rollup_query(query, query_type, message, deadline=None, choices=None):
+    """
+    Build a rollup digest from stored results, with an optional small gap-filling research call.
+    
+    Falls back to full research if the results store has nothing in the window.
+    
+    Args:
+        query: The query configuration, with a 'rollup' section and dates already filled in
+        query_type: Type of query (weekly, monthly, custom)
+        message: The message header used for research calls
+        deadline: Monotonic time by which the invocation must finish, if any
+        choices: Optional dict the chosen models are reported in, by role
+        
+    Returns:
+        The NewsResponse to send
+        
+    Raises:
+        ProviderError: If research is needed and fails
+    """
+    since = get_last_success(get_query_key(query))
+    if since is None:
+        since = datetime.datetime.now() - datetime.timedelta(days=SINCE_LAST_RUN_FALLBACK_DAYS.get(query_type, 8))
+    
+    rollup_response = build_rollup_response(query, since)
+    if not rollup_response.news_items:
+        logger.warning(f"No stored results for rollup '{query['title']}', falling back to full research")
+        return research_query(query, message, deadline=deadline, choices=choices)
+    
+    if not query["rollup"].get("gap_fill", False):
+        return rollup_response
+    
+    gap_query = dict(query, description=build_gap_fill_prompt(query["description"], rollup_response))
+    try:
+        gap_response = research_query(gap_query, message, ROLLUP_GAP_FILL_MODEL, deadline, choices)
+    except ProviderError as e:
+        logger.warning(f"Gap-filling research failed for '{query['title']}', sending stored results only: {str(e)}")
+        return rollup_response
+    
+    if isinstance(gap_response, NewsResponse):
+        return merge_news_responses(rollup_response, gap_response)
+    logger.warning(f"Could not format gap-filling research for '{query['title']}', sending stored results only")
+    return rollup_response
+
+def trim_digest(query, formatted_json):
+    """
+    Keep the most relevant and recent items of a digest within the query's size caps.
+    
+    Args:
+        query: The query configuration, with dates already filled in
+        formatted_json: The formatted NewsResponse (or unformatted fallback content)
+        
+    Returns:
+        The trimmed digest, or the fallback content unchanged
+    """
+    if not isinstance(formatted_json, NewsResponse):
+        return formatted_json
+    
+    return trim_news_response(
+        formatted_json,
+        query["description"],
+        lambda news_response: construct_telegram_messages(news_response, query["title"]),
+        max_items=query.get("max_items", DEFAULT_MAX_ITEMS),
+        max_parts=query.get("max_parts", DEFAULT_MAX_PARTS)
+    )
+
+def deliver_digest(query, formatted_json, direct_link):
+    """
+    Render a digest and deliver it to every subscriber of the query.
+    
+    Args:
+        query: The query configuration
+        formatted_json: The formatted NewsResponse (or unformatted fallback content)
+        direct_link: Perplexity search link attached to the last part
+        
+    Returns:
+        dict: Delivery status for each chat
+        
+    Raises:
+        TelegramAPIError: If the digest reached no subscriber
+    """
+    subscribers = get_subscribers(get_query_key(query))
+    logger.info(f"Delivering '{query['title']}' to {len(subscribers)} subscriber(s)")
+    
+    def render(**options):
+        with profile_stage("render"):
+            return construct_telegram_messages(formatted_json, query['title'], **options)
+    
+    with profile_stage("deliver"):
+        statuses = asyncio.run(broadcast_digest(subscribers, render, direct_link))
+    raise_if_undelivered(statuses)
+    return statuses
 
+def archive_digest(query, formatted_json, window_start=None, window_end=None):
+    """
+    Index a delivered digest in the searchable archive.
+    
+    Args:
+        query: The query configuration
+        formatted_json: The delivered NewsResponse (unformatted fallback content isn't archived)
+        window_start: Start of the time window the digest covers, if known
+        window_end: End of the time window the digest covers (defaults to now)
+    """
+    if not isinstance(formatted_json, NewsResponse):
+        return
+    try:
+        count = archive_news_response(
+            formatted_json, get_query_key(query), query["title"], window_start, window_end or datetime.datetime.now()
+        )
+        logger.info(f"Archived {count} news items of '{query['title']}'")
+    except ArchiveError as e:
+        logger.error(str(e))
 
-def research_and_send(queries, query_type):
+def research_and_send(queries, query_type, deadline=None):
     """
     Research topics using Perplexity AI and send results to Telegram.
     
     Args:
         queries: List of query configurations
         query_type: Type of query (daily, weekly, monthly, custom)
+        deadline: Monotonic time by which the invocation must finish, if any
     """
     if not queries:
         logger.warning(f"No {query_type} queries configured")
@@ -148,9 +356,19 @@ def research_and_send(queries, query_type):
                 continue
                 
             logger.info(f"Processing {query_type} query: {query['title']}")
+            started_at = time.monotonic()
+            # The date windows end when the run starts; a successful run records this time, so
+            # news published while it researched and delivered falls into the next window
+            window_end = datetime.datetime.now()
+            delivered = False
+            choices = {}
+            window_start = get_last_success(get_query_key(query)) or window_end - datetime.timedelta(
+                days=SINCE_LAST_RUN_FALLBACK_DAYS.get(query_type, 1)
+            )
             
             message = f"Here are the top {query['title']} news for you:\n\n"
-            query["description"] = parse_date_keys_to_dates(query["description"])
+            # Work on a copy so the configured placeholders survive warm Lambda invocations
+            query = resolve_query(query, query_type, window_end)
             
             try:
                 direct_link = construct_search_url(query["description"])
@@ -165,49 +383,39 @@ def research_and_send(queries, query_type):
             # Try up to max_retries times to get and send a valid response
             for attempt in range(max_retries):
                 try:
-                    # Get response from AI
-                    news_response = chat_completion_pplx(model, system_message, query['description'])
-                    news_content = news_response['choices'][0]['message']['content']
-                    citations = news_response.get('citations', [])
-                
-                    
-                    # Format message with citations
-                    unformatted_message = message + f"{news_content}\n\n"
-                    if citations:
-                        unformatted_message += "<b>Links:</b>\n"
-                        for i, citation in enumerate(citations, 1):
-                            unformatted_message += f"[{i}] {citation}\n"
-
-                    logger.info(f"Unformatted message:\n\n{unformatted_message}")
-
-                    # Get formatted JSON response
-                    formatted_json = get_formatted_json_with_ai(unformatted_message, NewsResponse)
+                    if query.get("rollup"):
+                        formatted_json = rollup_query(query, query_type, message, deadline, choices)
+                    else:
+                        formatted_json = research_query(query, message, deadline=deadline, choices=choices)
                     
-                    # Construct messages from the JSON response
-                    messages_to_send = construct_telegram_messages(formatted_json, query['title'])
+                    # Escape and repair model output locally so bad markup never costs a retry
+                    with profile_stage("sanitize"):
+                        formatted_json = sanitize_digest(formatted_json)
+                    with profile_stage("rank"):
+                        formatted_json = trim_digest(query, formatted_json)
                     
-                    logger.info(f"Sending {len(messages_to_send)} formatted messages to Telegram")
+                    # Render the JSON response and deliver it to every subscriber
+                    statuses = deliver_digest(query, formatted_json, direct_link)
                     
-                    # Send each message separately
-                    for i, msg in enumerate(messages_to_send):
-                        # Add part number if multiple messages
-                        if len(messages_to_send) > 1:
-                            msg_with_part = f"Part {i+1}/{len(messages_to_send)}\n\n{msg}"
-                        else:
-                            msg_with_part = msg
-                            
-                        # Only include direct_link on the last message instead of the first
-                        is_last_message = i == len(messages_to_send) - 1
-                        asyncio.run(send_message_telegram(msg_with_part, direct_link if is_last_message else None))
-                        logger.info(f"Sent message part {i+1}/{len(messages_to_send)} to Telegram")
+                    failed = [chat for chat, status in statuses.items() if not status["ok"]]
+                    if failed:
+                        logger.warning(f"Delivery of {query['title']} failed for {len(failed)} of {len(statuses)} chats: {', '.join(failed)}")
+                    logger.info(f"Successfully sent messages to Telegram for {query['title']} on attempt {attempt+1}")
+                    delivered = True
                     
-                    logger.info(f"Successfully sent all messages to Telegram for {query['title']} on attempt {attempt+1}")
+                    # Keep validated items so weekly and monthly rollups can reuse them
+                    if isinstance(formatted_json, NewsResponse) and not query.get("rollup"):
+                        try:
+                            store_news_response(formatted_json, get_query_key(query))
+                        except ResultsStoreError as e:
+                            logger.error(str(e))
+                    archive_digest(query, formatted_json, window_start, window_end)
                     break  # Success, exit retry loop
                     
-                except PerplexityAPIError as e:
-                    logger.error(f"Error getting information from Perplexity AI (attempt {attempt+1}): {str(e)}")
+                except ProviderError as e:
+                    logger.error(f"Error getting information from the research providers (attempt {attempt+1}): {str(e)}")
                     if attempt == max_retries - 1:  # Last attempt failed
-                        error_message = message + f"⚠️ Error retrieving information: {str(e)}\n\n"
+                        error_message = message + f"⚠️ Error retrieving information: {escape_html(str(e))}\n\n"
                         error_message += "Please try again later or check your API configuration."
                         asyncio.run(send_message_telegram(error_message, direct_link))
                     else:
@@ -220,84 +428,53 @@ def research_and_send(queries, query_type):
                         # Continue to next iteration which will make a new AI request
                     else:
                         logger.error(f"Failed to send message after {max_retries} attempts")
+            
+            duration = time.monotonic() - started_at
+            tiers = ", ".join(f"{role} {choice['model']} ({choice['tier']})" for role, choice in choices.items())
+            logger.info(f"Finished {query_type} query '{query['title']}' in {duration:.1f}s (delivered: {delivered}, models: {tiers or 'none'})")
+            record_query_run(get_query_key(query), duration, delivered, choices, window_end)
         
         except Exception as e:
             logger.error(f"Unexpected error processing query '{query['title']}': {str(e)}")
             try:
-                error_message = f"⚠️ Error processing query '{query['title']}': {str(e)}\n\nPlease check the logs for more details."
+                error_message = f"⚠️ Error processing query '{query['title']}': {escape_html(str(e))}\n\nPlease check the logs for more details."
                 asyncio.run(send_message_telegram(error_message, ""))
             except Exception as send_error:
                 logger.error(f"Failed to send error notification to Telegram: {str(send_error)}")
 
-def construct_telegram_messages(json_response, title, max_message_size=4000):
+def construct_telegram_messages(json_response, title, max_message_size=4000, include_links=True, max_items_per_category=None):
     """
     Construct multiple Telegram messages from a JSON response if needed due to size limitations.
     
     Args:
         json_response: The formatted JSON response containing categorized news items
         title: The title of the query
-        max_message_size: Maximum size of a Telegram message (default 4000 characters)
+        max_message_size: Maximum size of a Telegram message, as Telegram measures it (default 4000)
+        include_links: Whether to include each news item's source link
+        max_items_per_category: Maximum number of news items shown per category (all if None)
         
     Returns:
-        List of message strings to send
+        List of message strings to send, packed into as few messages as possible
     """
-    messages = []
-    current_message = f"Here are the top {title} news for you:\n\n"
-    current_size = len(current_message)
-    
-    # If json_response is already a string, try to parse it
+    # If json_response is a string, decode it the same way formatter output is decoded
     if isinstance(json_response, str):
         try:
-            import json
-            parsed_json = json.loads(json_response)
-            categories = parsed_json.get("news_items", [])
-        except Exception as e:
+            json_response = decode_news_response(json_response)
+        except DecodeError as e:
             logger.error(f"Error parsing JSON string: {str(e)}")
             # Return the original string split into chunks if needed
             return split_message(json_response, max_message_size)
-    else:
-        # If it's already a NewsResponse object
-        categories = json_response.news_items
     
-    for category in categories:
-        # Add category header
-        category_header = f"<b><u>📌 {category.category}</u></b>\n\n"
-        
-        # If adding this category header would exceed the limit, start a new message
-        if current_size + len(category_header) > max_message_size:
-            messages.append(current_message)
-            current_message = category_header
-            current_size = len(category_header)
-        else:
-            current_message += category_header
-            current_size += len(category_header)
-        
-        # Process news items in this category
-        for item in category.news_items:
-            # Format each news item
-            item_text = f"<b>{item.title}</b>\n{item.description}\n{item.link}\n\n"
-            item_size = len(item_text)
-            
-            # If adding this item would exceed the limit, start a new message
-            if current_size + item_size > max_message_size:
-                messages.append(current_message)
-                current_message = item_text
-                current_size = item_size
-            else:
-                current_message += item_text
-                current_size += item_size
-        current_message += "\n\n"
-    
-    # Add the last message if it has content
-    if current_message:
-        messages.append(current_message)
-    
-    return messages
+    blocks = render_news_blocks(json_response, title, include_links, max_items_per_category)
+    return pack_blocks(blocks, max_message_size)
 
 def split_message(message, max_size=4000):
     """
     Split a message into multiple parts if it exceeds the maximum size.
     
+    Parts are measured the way Telegram measures them and never split inside a tag,
+    an entity or a character.
+    
     Args:
         message: The message to split
         max_size: Maximum size of each part
@@ -305,58 +482,179 @@ def split_message(message, max_size=4000):
     Returns:
         List of message parts
     """
-    if len(message) <= max_size:
-        return [message]
-    
-    parts = []
-    for i in range(0, len(message), max_size):
-        parts.append(message[i:i+max_size])
-    
-    return parts
+    return split_html(message, max_size)
 
+@profile_handler
 def daily_research(event, context):
     """Lambda handler for daily research queries"""
     try:
         logger.info("Starting daily research")
-        research_and_send(daily_queries, "daily")
+        research_and_send(daily_queries, "daily", get_deadline(context))
         return {"statusCode": 200, "body": "Daily research completed successfully"}
     except Exception as e:
         logger.error(f"Error in daily research: {str(e)}")
         return {"statusCode": 500, "body": f"Error in daily research: {str(e)}"}
 
+@profile_handler
 def weekly_research(event, context):
     """Lambda handler for weekly research queries"""
     try:
         logger.info("Starting weekly research")
-        research_and_send(weekly_queries, "weekly")
+        research_and_send(weekly_queries, "weekly", get_deadline(context))
         return {"statusCode": 200, "body": "Weekly research completed successfully"}
     except Exception as e:
         logger.error(f"Error in weekly research: {str(e)}")
         return {"statusCode": 500, "body": f"Error in weekly research: {str(e)}"}
 
+@profile_handler
 def monthly_research(event, context):
     """Lambda handler for monthly research queries"""
     try:
         logger.info("Starting monthly research")
-        research_and_send(monthly_queries, "monthly")
+        research_and_send(monthly_queries, "monthly", get_deadline(context))
         return {"statusCode": 200, "body": "Monthly research completed successfully"}
     except Exception as e:
         logger.error(f"Error in monthly research: {str(e)}")
         return {"statusCode": 500, "body": f"Error in monthly research: {str(e)}"}
 
+def build_digest(query, deliver=False, deadline=None):
+    """
+    Research a resolved query and render its Telegram digest, optionally delivering it.
+    
+    Args:
+        query: The query configuration, with dates already filled in
+        deliver: Whether to send the digest to Telegram
+        deadline: Monotonic time by which the invocation must finish, if any
+        
+    Returns:
+        dict: The title, search link, message parts, delivery status for each chat and chosen models
+        
+    Raises:
+        ProviderError: If every research provider fails
+        TelegramAPIError: If delivery fails
+    """
+    message = f"Here are the top {query['title']} news for you:\n\n"
+    try:
+        direct_link = construct_search_url(query["description"])
+    except MessageFormattingError as e:
+        logger.error(f"Error constructing search URL: {str(e)}")
+        direct_link = "https://www.perplexity.ai/"
+    
+    choices = {}
+    formatted_json = research_query(query, message, deadline=deadline, choices=choices)
+    with profile_stage("sanitize"):
+        formatted_json = sanitize_digest(formatted_json)
+    with profile_stage("rank"):
+        formatted_json = trim_digest(query, formatted_json)
+    with profile_stage("render"):
+        messages_to_send = construct_telegram_messages(formatted_json, query['title'])
+    statuses = {}
+    if deliver:
+        statuses = deliver_digest(query, formatted_json, direct_link)
+        archive_digest(query, formatted_json)
+    
+    return {
+        "title": query["title"],
+        "link": direct_link,
+        "messages": messages_to_send,
+        "delivered": statuses,
+        "models": choices,
+    }
+
+def _endpoint_response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(body),
+    }
+
+@profile_handler
+def research_endpoint(event, context):
+    """
+    Lambda function URL handler for on-demand research.
+    
+    Accepts a JSON body (or query string) with 'description', optional 'title' and
+    'deliver'. Requests need "Authorization: Bearer <ENDPOINT_TOKEN>"; without a
+    configured token the endpoint refuses every request. Concurrent requests for the
+    same resolved query that reach the same container share one research call, and
+    results are cached there for RESEARCH_CACHE_TTL seconds.
+    """
+    if not ENDPOINT_TOKEN:
+        logger.error("Research endpoint called, but ENDPOINT_TOKEN is not set")
+        return _endpoint_response(503, {"error": "Endpoint disabled: ENDPOINT_TOKEN is not set"})
+    
+    headers = {key.lower(): value for key, value in (event.get("headers") or {}).items()}
+    if not hmac.compare_digest(headers.get("authorization", "").encode("utf-8"), f"Bearer {ENDPOINT_TOKEN}".encode("utf-8")):
+        return _endpoint_response(401, {"error": "Unauthorized"})
+    
+    try:
+        body = event.get("body") or ""
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body).decode("utf-8")
+        request = json.loads(body) if body else {}
+        if not isinstance(request, dict):
+            raise ValueError("Request body must be a JSON object")
+        request.update({key: values[-1] for key, values in parse_qs(event.get("rawQueryString", "")).items()})
+    except (ValueError, UnicodeDecodeError) as e:
+        return _endpoint_response(400, {"error": f"Invalid request: {str(e)}"})
+    
+    if not request.get("description"):
+        return _endpoint_response(400, {"error": "Missing 'description'"})
+    for field in ("description", "title"):
+        if field in request and not isinstance(request[field], str):
+            return _endpoint_response(400, {"error": f"'{field}' must be a string"})
+    
+    deliver = str(request.get("deliver", "false")).lower() in ("1", "true", "yes")
+    query = resolve_query({"title": request.get("title") or "Research", "description": request["description"]})
+    key = hashlib.sha256(f"{query['title']}\n{query['description']}\n{deliver}".encode("utf-8")).hexdigest()
+    
+    try:
+        digest, source = research_flight.do(key, lambda: build_digest(query, deliver, get_deadline(context)))
+    except (ProviderError, TelegramAPIError) as e:
+        logger.error(f"Error in research endpoint: {str(e)}")
+        return _endpoint_response(502, {"error": str(e)})
+    except Exception as e:
+        logger.error(f"Unexpected error in research endpoint: {str(e)}")
+        return _endpoint_response(500, {"error": str(e)})
+    
+    logger.info(f"Research endpoint served '{query['title']}' ({source})")
+    return _endpoint_response(200, dict(digest, source=source))
+
 # Dynamic function generator for custom queries
 def generate_custom_research_function(query_config):
     """Generate a custom research function based on the provided configuration"""
+    @profile_handler
     def custom_research(event, context):
         try:
             logger.info(f"Starting custom research: {query_config['title']}")
-            research_and_send([{"title": query_config["title"], "description": query_config["description"]}], "custom")
+            research_and_send([dict(query_config)], "custom", get_deadline(context))
             return {"statusCode": 200, "body": f"Custom research '{query_config['title']}' completed successfully"}
         except Exception as e:
             logger.error(f"Error in custom research '{query_config['title']}': {str(e)}")
             return {"statusCode": 500, "body": f"Error in custom research '{query_config['title']}': {str(e)}"}
     return custom_research
 
+@profile_handler
+def custom_research_batch(event, context):
+    """
+    Lambda handler for custom queries packed into one function by generate_serverless_config.py.
+    
+    The schedule event input carries the names of the custom queries to run, in order.
+    """
+    query_names = (event or {}).get("queries", [])
+    try:
+        logger.info(f"Starting custom research batch: {', '.join(query_names)}")
+        custom_queries_by_name = {query["name"]: query for query in CUSTOM_QUERIES}
+        queries = [dict(custom_queries_by_name[name]) for name in query_names if name in custom_queries_by_name]
+        missing = [name for name in query_names if name not in custom_queries_by_name]
+        if missing:
+            logger.warning(f"Unknown custom queries in batch: {', '.join(missing)}")
+        research_and_send(queries, "custom", get_deadline(context))
+        return {"statusCode": 200, "body": f"Custom research batch completed successfully ({len(queries)} queries)"}
+    except Exception as e:
+        logger.error(f"Error in custom research batch: {str(e)}")
+        return {"statusCode": 500, "body": f"Error in custom research batch: {str(e)}"}
+
 # Dynamically create custom research functions
 for custom_query in CUSTOM_QUERIES:
     function_name = custom_query["name"]
@@ -0,0 +1,179 @@
+import datetime
+import logging
+from config import RUN_HISTORY_FILE, MAX_RECORDED_DURATIONS
+from json_functions import JSONProcessingError
+from state_functions import load_state, update_state
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class RunHistoryError(Exception):
+    """Custom exception for run history errors"""
+    pass
+
+def get_query_key(query):
+    """
+    Get the key a query is tracked under in the run history.
+    
+    Custom queries are keyed by their function name, all others by their title.
+    
+    Args:
+        query: The query configuration
+        
+    Returns:
+        str: The run history key for the query
+    """
+    return query.get("name") or query["title"]
+
+def load_run_history(filename=None):
+    """
+    Load the run history, from STATE_BUCKET if set and from disk otherwise.
+    
+    Args:
+        filename: The run history file (defaults to RUN_HISTORY_FILE)
+        
+    Returns:
+        dict: The run history, or an empty history if none was recorded yet
+    """
+    try:
+        history = load_state(filename or RUN_HISTORY_FILE, lambda: {"queries": {}})
+    except JSONProcessingError as e:
+        logger.error(f"Error loading run history, using an empty one: {str(e)}")
+        return {"queries": {}}
+    
+    history.setdefault("queries", {})
+    return history
+
+def update_run_history(change, filename=None):
+    """
+    Apply a change to the stored run history.
+    
+    The history is read, changed and written back with a file lock (or, in
+    STATE_BUCKET, a conditional write), so concurrent runs never lose each other's
+    updates. A history that can't be read is left untouched rather than replaced
+    by a fresh one.
+    
+    Args:
+        change: Function that modifies the run history in place
+        filename: The run history file (defaults to RUN_HISTORY_FILE)
+        
+    Raises:
+        RunHistoryError: If the history can't be read or written
+    """
+    def apply(history):
+        history.setdefault("queries", {})
+        change(history)
+    
+    try:
+        update_state(filename or RUN_HISTORY_FILE, apply, lambda: {"queries": {}})
+    except JSONProcessingError as e:
+        raise RunHistoryError(f"Error updating run history: {str(e)}")
+
+def record_query_run(query_key, duration, success, models=None, window_end=None, filename=None):
+    """
+    Record the outcome and duration of a single query run.
+    
+    Only the most recent MAX_RECORDED_DURATIONS durations are kept per query.
+    
+    Args:
+        query_key: The run history key of the query
+        duration: How long the query took, in seconds
+        success: Whether the digest was delivered
+        models: The models chosen for the run, by role
+        window_end: End of the time window the run covered, stored as the last success so the
+                    next {since_last_run} window starts there (defaults to now)
+        filename: The run history file (defaults to RUN_HISTORY_FILE)
+    """
+    def record(history):
+        entry = history["queries"].setdefault(query_key, {"durations": []})
+        entry["durations"] = (entry.get("durations", []) + [round(duration, 2)])[-MAX_RECORDED_DURATIONS:]
+        entry["last_run"] = datetime.datetime.now().isoformat()
+        if success:
+            entry["last_success"] = (window_end or datetime.datetime.now()).isoformat()
+        if models:
+            entry["models"] = models
+    
+    try:
+        update_run_history(record, filename)
+    except RunHistoryError as e:
+        logger.error(str(e))
+
+def record_model_usage(model, latency, input_tokens, output_tokens, cost, filename=None):
+    """
+    Record the latency, token usage and cost of a single model call.
+    
+    Only the most recent MAX_RECORDED_DURATIONS calls are kept per model; costs are
+    added to the current month's spend.
+    
+    Args:
+        model: The model that was called
+        latency: How long the call took, in seconds
+        input_tokens: Prompt tokens of the call
+        output_tokens: Completion tokens of the call
+        cost: Estimated cost of the call, in dollars
+        filename: The run history file (defaults to RUN_HISTORY_FILE)
+    """
+    def record(history):
+        entry = history.setdefault("models", {}).setdefault(model, {})
+        for field, value in (("latencies", round(latency, 2)), ("input_tokens", input_tokens), ("output_tokens", output_tokens)):
+            entry[field] = (entry.get(field, []) + [value])[-MAX_RECORDED_DURATIONS:]
+        
+        spend = history.setdefault("spend", {})
+        month = datetime.date.today().strftime("%Y-%m")
+        spend[month] = round(spend.get(month, 0.0) + cost, 6)
+    
+    try:
+        update_run_history(record, filename)
+    except RunHistoryError as e:
+        logger.error(str(e))
+
+def get_month_spend(history, month=None):
+    """
+    Get the estimated model spend of a month.
+    
+    Args:
+        history: The run history
+        month: The month as "YYYY-MM" (defaults to the current month)
+        
+    Returns:
+        float: The spend in dollars
+    """
+    return history.get("spend", {}).get(month or datetime.date.today().strftime("%Y-%m"), 0.0)
+
+def get_query_durations(history):
+    """
+    Get the recorded durations of every query in a run history.
+    
+    Args:
+        history: The run history
+        
+    Returns:
+        dict: Mapping of query key to a list of durations in seconds
+    """
+    return {
+        key: entry.get("durations", [])
+        for key, entry in history.get("queries", {}).items()
+        if entry.get("durations")
+    }
+
+def get_last_success(query_key, filename=None):
+    """
+    Get the time of the last successful delivery of a query.
+    
+    Args:
+        query_key: The run history key of the query
+        filename: The run history file (defaults to RUN_HISTORY_FILE)
+        
+    Returns:
+        datetime.datetime: The time of the last successful delivery, or None if the query never succeeded
+    """
+    entry = load_run_history(filename)["queries"].get(query_key, {})
+    if not entry.get("last_success"):
+        return None
+    
+    try:
+        return datetime.datetime.fromisoformat(entry["last_success"])
+    except ValueError:
+        logger.error(f"Invalid last_success timestamp for '{query_key}': {entry['last_success']}")
+        return None
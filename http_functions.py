@@ -0,0 +1,55 @@
+import logging
+import httpx
+import requests
+from config import CASSETTE_MODE, CASSETTE_FILE, CASSETTE_SPEED
+from cassette_functions import Cassette, CassetteAdapter, CassetteTransport
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_cassette = None
+_session = None
+_openai_http_client = None
+
+def get_cassette():
+    """
+    Get the cassette configured by CASSETTE_MODE, if any.
+    
+    Returns:
+        Cassette: The shared cassette, or None when not recording or replaying
+    """
+    global _cassette
+    if CASSETTE_MODE and _cassette is None:
+        _cassette = Cassette(CASSETTE_FILE, CASSETTE_MODE, CASSETTE_SPEED)
+    return _cassette
+
+def get_http_session():
+    """
+    Get the shared requests session used for Perplexity and Telegram calls.
+    
+    Returns:
+        requests.Session: The session, recording or replaying through the cassette if one is configured
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        cassette = get_cassette()
+        if cassette:
+            adapter = CassetteAdapter(cassette)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+def get_openai_http_client():
+    """
+    Get the HTTP client for the OpenAI client.
+    
+    Returns:
+        httpx.Client: A client recording or replaying through the cassette, or None to use the default
+    """
+    global _openai_http_client
+    cassette = get_cassette()
+    if cassette and _openai_http_client is None:
+        _openai_http_client = httpx.Client(transport=CassetteTransport(cassette), timeout=600)
+    return _openai_http_client
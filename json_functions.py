@@ -1,6 +1,13 @@
+import contextlib
 import json
 import logging
 import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are still atomic, but concurrent updates aren't serialized
+    fcntl = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -28,6 +35,9 @@ def write_json(data, filename):
     """
     Write data to a JSON file.
     
+    The data is written to a temporary file that then replaces the target, so
+    readers never see a half-written file.
+    
     Args:
         data: The data to write
         filename: The file to write to
@@ -41,13 +51,69 @@ def write_json(data, filename):
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
             
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        with tempfile.NamedTemporaryFile('w', dir=directory or '.', prefix=os.path.basename(filename) + '.',
+                                         suffix='.tmp', delete=False) as f:
+            try:
+                json.dump(data, f, indent=2)
+            except Exception:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, filename)
         logger.info(f"Successfully wrote data to {filename}")
     except Exception as e:
         logger.error(f"Error writing JSON to {filename}: {str(e)}")
         raise JSONProcessingError(f"Error writing JSON to {filename}: {str(e)}")
 
+@contextlib.contextmanager
+def locked(filename):
+    """
+    Hold an exclusive lock on a file, across threads and processes, for a read-modify-write.
+    
+    The lock is taken on a separate "<filename>.lock" file, since the file itself is
+    replaced on every write.
+    
+    Args:
+        filename: The file to lock
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(filename + '.lock', 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+def update_json(filename, change, default):
+    """
+    Read, change and write back a JSON file while holding its lock.
+    
+    Args:
+        filename: The file to update
+        change: Function that modifies the loaded data in place
+        default: Factory for the data to start from if the file doesn't exist yet
+        
+    Returns:
+        The updated data
+        
+    Raises:
+        JSONProcessingError: If the file can't be read or written; an unreadable
+        file is left as it is rather than overwritten
+    """
+    try:
+        with locked(filename):
+            data = read_json(filename) if os.path.exists(filename) else default()
+            change(data)
+            write_json(data, filename)
+            return data
+    except OSError as e:
+        logger.error(f"Error locking {filename}: {str(e)}")
+        raise JSONProcessingError(f"Error locking {filename}: {str(e)}")
+
 def parse_string_to_json(string):
     """
     Parse a string to JSON.
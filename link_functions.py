@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit, urlunsplit, unquote
+import httpx
+from config import (
+    CASSETTE_MODE, LINK_RESOLVE, LINK_CACHE_FILE, LINK_CACHE_TTL, LINK_DEAD_CACHE_TTL,
+    LINK_RESOLVE_CONCURRENCY, LINK_RESOLVE_TIMEOUT
+)
+from json_functions import JSONProcessingError
+from news_models import NewsItem, NewsCategory, NewsResponse
+from state_functions import load_state, update_state
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "twclid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "mkt_tok", "ref_src", "cmpid", "s_cid",
+}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Statuses that say more about the client (bot blocking, rate limits) or a passing
+# server problem than about the page, so the link is kept
+INCONCLUSIVE_STATUSES = {401, 403, 429}
+USER_AGENT = "Mozilla/5.0 (compatible; InfoRanger link checker)"
+
+def _is_tracking(segment):
+    name = unquote(segment.split("=", 1)[0]).lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def canonicalize_url(url):
+    """
+    Canonicalize an http(s) URL.
+
+    The scheme and host are lower-cased, IDN hosts encoded, default ports and
+    fragments dropped (except "#!" and "#/" routes) and tracking parameters such as
+    utm_* and fbclid removed. The remaining query is kept as it was encoded. Other
+    text is returned stripped but otherwise unchanged.
+
+    Args:
+        url: The URL
+
+    Returns:
+        str: The canonical URL
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.rstrip(".")
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    if ":" in host:
+        host = f"[{host}]"  # IPv6
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    if "@" in parts.netloc:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+
+    query = "&".join(segment for segment in parts.query.split("&") if segment and not _is_tracking(segment))
+    fragment = parts.fragment if parts.fragment.startswith(("!", "/")) else ""
+    return urlunsplit((scheme, netloc, parts.path or "/", query, fragment))
+
+def link_key(url):
+    """
+    Key under which two links count as the same page.
+
+    Ignores the scheme, "www." and a trailing slash. The host is compared
+    case-insensitively, but paths and queries are case-sensitive (e.g. short links).
+    """
+    canonical = canonicalize_url(url)
+    parts = urlsplit(canonical)
+    if parts.scheme not in DEFAULT_PORTS:
+        return canonical
+    host = parts.netloc[len("www."):] if parts.netloc.startswith("www.") else parts.netloc
+    key = host + parts.path.rstrip("/")
+    if parts.query:
+        key += "?" + parts.query
+    if parts.fragment:
+        key += "#" + parts.fragment
+    return key
+
+def load_link_cache(filename=None):
+    """
+    Load the link resolution cache, from STATE_BUCKET when deployed.
+
+    Args:
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+
+    Returns:
+        dict: Resolution results keyed by canonical URL, or an empty cache if none exists yet
+    """
+    try:
+        return load_state(filename or LINK_CACHE_FILE, lambda: {"links": {}}).get("links", {})
+    except JSONProcessingError as e:
+        logger.error(f"Error loading link cache, starting fresh: {str(e)}")
+        return {}
+
+def save_link_cache(results, filename=None, now=None):
+    """
+    Add resolution results to the link resolution cache and drop expired entries.
+
+    The cache is updated under a lock (or a conditional write in STATE_BUCKET), so
+    links checked by concurrent runs are kept.
+
+    Args:
+        results: Resolution results keyed by canonical URL
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+        now: The time to check expiry against (defaults to now)
+    """
+    now = now or time.time()
+
+    def add(cache):
+        links = dict(cache.get("links", {}), **results)
+        cache["links"] = {url: result for url, result in links.items() if _is_fresh(result, now)}
+
+    try:
+        update_state(filename or LINK_CACHE_FILE, add, lambda: {"links": {}})
+    except JSONProcessingError as e:
+        logger.error(f"Error saving link cache: {str(e)}")
+
+def _is_fresh(result, now):
+    if not result:
+        return False
+    ttl = LINK_CACHE_TTL if result.get("alive") else LINK_DEAD_CACHE_TTL
+    return now - result.get("checked", 0) < ttl
+
+async def _check_link(client, semaphore, url):
+    """Follow a link's redirects and check that its page exists"""
+    async with semaphore:
+        try:
+            response = await client.head(url)
+            if response.status_code in (403, 405, 501):
+                # Some servers don't answer HEAD requests properly; fetch the headers with GET instead
+                async with client.stream("GET", url) as response:
+                    pass
+        except httpx.TimeoutException:
+            return {"final": url, "alive": None, "status": None}
+        except httpx.HTTPError as e:
+            logger.info(f"Link {url} is unreachable: {type(e).__name__}")
+            return {"final": url, "alive": False, "status": None}
+
+    status = response.status_code
+    alive = None if status in INCONCLUSIVE_STATUSES or status >= 500 else status < 400
+    return {"final": canonicalize_url(str(response.url)), "alive": alive, "status": status}
+
+async def check_links(urls, concurrency=LINK_RESOLVE_CONCURRENCY, timeout=LINK_RESOLVE_TIMEOUT):
+    """
+    Resolve redirects and check liveness of links concurrently over one pooled client.
+
+    Args:
+        urls: The canonical URLs to check
+        concurrency: Maximum number of links checked at once
+        timeout: Seconds to wait for each request
+
+    Returns:
+        dict: Per URL, the canonical 'final' URL after redirects, 'alive' (True, False,
+        or None if inconclusive) and the HTTP 'status'
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        follow_redirects=True, timeout=timeout, limits=limits, headers={"User-Agent": USER_AGENT}
+    ) as client:
+        results = await asyncio.gather(*(_check_link(client, semaphore, url) for url in urls))
+    return dict(zip(urls, results))
+
+def resolve_links(urls, filename=None):
+    """
+    Resolve links through the persistent cache, checking only missing or expired ones.
+
+    Live results are cached for LINK_CACHE_TTL seconds, dead and inconclusive ones
+    for LINK_DEAD_CACHE_TTL.
+
+    Args:
+        urls: The canonical URLs to resolve
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+
+    Returns:
+        dict: The resolution result of every URL, as returned by check_links
+    """
+    cache = load_link_cache(filename)
+    now = time.time()
+    pending = sorted({url for url in urls if not _is_fresh(cache.get(url), now)})
+    if pending:
+        started_at = time.monotonic()
+        checked = asyncio.run(check_links(pending))
+        checked = {url: dict(result, checked=now) for url, result in checked.items()}
+        cache.update(checked)
+        save_link_cache(checked, filename, now)
+        dead = sum(result["alive"] is False for result in checked.values())
+        logger.info(f"Checked {len(pending)} links in {time.monotonic() - started_at:.1f}s ({dead} dead), {len(urls) - len(pending)} cached")
+    return {url: cache[url] for url in urls}
+
+def clean_links(urls, resolve=None, filename=None):
+    """
+    Canonicalize links and, if enabled, resolve their redirects and drop dead ones.
+
+    Resolution is skipped while recording or replaying API traffic, so cassettes
+    stay complete.
+
+    Args:
+        urls: The links
+        resolve: Whether to resolve links (defaults to LINK_RESOLVE)
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+
+    Returns:
+        dict: The cleaned link for every non-empty original link, or None if it is dead
+    """
+    cleaned = {url: canonicalize_url(url) for url in urls if url and url.strip()}
+    if (LINK_RESOLVE if resolve is None else resolve) and not CASSETTE_MODE:
+        resolvable = {url for url in cleaned.values() if urlsplit(url).scheme in DEFAULT_PORTS}
+        results = resolve_links(resolvable, filename)
+        for url, canonical in cleaned.items():
+            if canonical in results:
+                result = results[canonical]
+                cleaned[url] = None if result["alive"] is False else result["final"]
+    return cleaned
+
+def clean_citations(citations, resolve=None, filename=None):
+    """
+    Clean a research response's citations for the Links list.
+
+    Citations keep their original numbers, since the research text refers to them,
+    and duplicates are listed once under all their numbers. Dead citations are dropped.
+
+    Args:
+        citations: The citation URLs, in order
+        resolve: Whether to resolve links (defaults to LINK_RESOLVE)
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+
+    Returns:
+        list: (citation numbers, cleaned URL) pairs, in order of first citation
+    """
+    cleaned = clean_links(citations, resolve, filename)
+    groups = {}
+    for number, citation in enumerate(citations, 1):
+        url = cleaned.get(citation)
+        if url:
+            groups.setdefault(link_key(url), ([], url))[0].append(number)
+    return list(groups.values())
+
+def clean_news_links(news_response, resolve=None, filename=None):
+    """
+    Clean the link of every news item of a digest.
+
+    Dead links are replaced by an empty link, which isn't rendered.
+
+    Args:
+        news_response: The NewsResponse
+        resolve: Whether to resolve links (defaults to LINK_RESOLVE)
+        filename: The cache file (defaults to LINK_CACHE_FILE)
+
+    Returns:
+        NewsResponse: The digest with cleaned links
+    """
+    cleaned = clean_links(
+        [item.link for category in news_response.news_items for item in category.news_items], resolve, filename
+    )
+    return NewsResponse(news_items=[
+        NewsCategory(
+            category=category.category,
+            news_items=[
+                NewsItem(title=item.title, description=item.description, link=cleaned.get(item.link) or "")
+                for item in category.news_items
+            ]
+        )
+        for category in news_response.news_items
+    ])
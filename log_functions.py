@@ -0,0 +1,56 @@
+import hashlib
+import logging
+import random
+from config import LOG_PAYLOAD_MAX_CHARS, LOG_FULL_PAYLOADS, LOG_SAMPLE_RATES
+
+class LoggedPayload:
+    """
+    A large value to log, formatted only if a log record is actually emitted.
+    
+    Unless LOG_FULL_PAYLOADS is on, the value is cut to LOG_PAYLOAD_MAX_CHARS and
+    tagged with its full size and a short hash, so the same payload can still be
+    recognised across log lines.
+    """
+    __slots__ = ("value",)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else str(self.value)
+        if LOG_FULL_PAYLOADS or len(text) <= LOG_PAYLOAD_MAX_CHARS:
+            return text
+        digest = hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()[:12]
+        return f"{text[:LOG_PAYLOAD_MAX_CHARS]}… [{len(text)} chars, sha1 {digest}]"
+
+def log_payload(logger, level, message, payload, category):
+    """
+    Log a message with a large payload lazily, truncated and sampled by category.
+    
+    Nothing is formatted if the level is disabled or the record is sampled out.
+    Categories are sampled at the rate configured in LOG_SAMPLE_RATES (default 1).
+    
+    Args:
+        logger: The logger to log to
+        level: The logging level, e.g. logging.INFO
+        message: The message, logged before the payload
+        payload: The value to log, e.g. a full API response
+        category: The sampling category, e.g. "completion"
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATES.get(category, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    logger.log(level, "%s:\n\n%s", message, LoggedPayload(payload))
+
+class LogByteCounter(logging.Handler):
+    """Logging handler that counts the records and bytes that would be written to the logs"""
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = 0
+        self.bytes = 0
+    
+    def emit(self, record):
+        self.records += 1
+        self.bytes += len(self.format(record).encode("utf-8")) + 1  # Plus the newline
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List
+
+class NewsItem(BaseModel):
+    """
+    Represents a single news item with title, description, and source link.
+    
+    This model is used to structure news data retrieved from AI services before
+    formatting and sending to Telegram. Each news item represents one piece of news
+    that will be displayed to the user.
+    
+    News records are immutable; build new ones instead of changing fields.
+    """
+    model_config = ConfigDict(frozen=True)
+    
+    title: str = Field(
+        description="The headline or title of the news item"
+    )
+    description: str = Field(
+        description="The main content or body of the news item containing details and context"
+    )
+    link: str = Field(
+        description="URL pointing to the source or original article"
+    )
+
+class NewsCategory(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    category: str = Field(
+        description="The category of the news item"
+    )
+    news_items: List[NewsItem] = Field(
+        description="A list of news items"
+    )
+
+class NewsResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    news_items: List[NewsCategory] = Field(
+        description="A list of categorized news items"
+    )
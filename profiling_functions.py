@@ -0,0 +1,173 @@
+import contextlib
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from config import PROFILING, PROFILE_TOP_N, PROFILE_DIR, PROFILE_S3_BUCKET
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Returned by profile_stage when profiling is off, so disabled stages cost one check
+_NO_PROFILE = contextlib.nullcontext()
+
+class _StageStats:
+    """Profiles and memory statistics collected for one pipeline stage"""
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.profiles = []
+        self.allocated = 0
+        self.peak = 0
+        self.top_allocations = []
+
+class _Run:
+    """State of the handler invocation being profiled"""
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.active = []  # Profilers of the stages currently entered, innermost last
+
+_run = None
+
+def _snapshot():
+    """Take a tracemalloc snapshot without the profiler's own allocations"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+def profile_stage(name):
+    """
+    Profile a pipeline stage with cProfile and tracemalloc.
+
+    Returns a no-op context when PROFILING is off or no profiled handler is running.
+    Nested stages pause their parent's profiler, so each stage's profile only covers
+    its own code.
+
+    Args:
+        name: The stage name, e.g. "research" or "render"
+
+    Returns:
+        A context manager
+    """
+    if _run is None:
+        return _NO_PROFILE
+    return _profile_stage(name)
+
+@contextlib.contextmanager
+def _profile_stage(name):
+    run = _run
+    stats = run.stages.setdefault(name, _StageStats())
+    profiler = cProfile.Profile()
+
+    if run.active:
+        run.active[-1].disable()
+    run.active.append(profiler)
+
+    snapshot = _snapshot()
+    traced_before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    started_at = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stats.seconds += time.perf_counter() - started_at
+        stats.calls += 1
+        stats.profiles.append(profiler)
+
+        traced_after, peak = tracemalloc.get_traced_memory()
+        stats.allocated += traced_after - traced_before
+        stats.peak = max(stats.peak, peak - traced_before)
+        differences = _snapshot().compare_to(snapshot, "lineno")
+        stats.top_allocations = sorted(
+            stats.top_allocations + differences[:PROFILE_TOP_N], key=lambda stat: stat.size_diff, reverse=True
+        )[:PROFILE_TOP_N]
+
+        run.active.pop()
+        if run.active:
+            run.active[-1].enable()
+
+def _summarize(run):
+    lines = [f"Profile of {run.name}:"]
+    for name, stats in run.stages.items():
+        lines.append(
+            f"== Stage '{name}': {stats.calls} calls, {stats.seconds:.3f}s, "
+            f"net {stats.allocated / 1024:.0f} KiB allocated, peak {stats.peak / 1024:.0f} KiB"
+        )
+        output = io.StringIO()
+        pstats.Stats(*stats.profiles, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        lines.append(output.getvalue().strip())
+        lines.append("Top allocations:")
+        lines.extend(f"  {stat}" for stat in stats.top_allocations)
+    return "\n".join(lines)
+
+def _dump(run):
+    """Write each stage's cProfile data to PROFILE_DIR, and upload it to PROFILE_S3_BUCKET if set"""
+    if not PROFILE_DIR and not PROFILE_S3_BUCKET:
+        return
+
+    directory = PROFILE_DIR or "/tmp"
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    for name, stats in run.stages.items():
+        filename = os.path.join(directory, f"{run.name}-{stamp}-{name}.prof")
+        pstats.Stats(*stats.profiles).dump_stats(filename)
+        logger.info(f"Wrote profile of stage '{name}' to {filename}")
+
+        if PROFILE_S3_BUCKET:
+            try:
+                import boto3  # Provided by the Lambda runtime
+                boto3.client("s3").upload_file(filename, PROFILE_S3_BUCKET, f"profiles/{os.path.basename(filename)}")
+            except Exception as e:
+                logger.error(f"Error uploading profile to S3: {str(e)}")
+
+def profile_handler(handler):
+    """
+    Profile every pipeline stage of a Lambda handler invocation when PROFILING is on.
+
+    Logs a top-N summary of each stage's CPU time and memory allocations at the end
+    of the invocation, and dumps the profiles to PROFILE_DIR or PROFILE_S3_BUCKET.
+    When PROFILING is off the handler is returned unchanged.
+
+    Args:
+        handler: The Lambda handler to wrap
+
+    Returns:
+        The wrapped handler
+    """
+    if not PROFILING:
+        return handler
+
+    @functools.wraps(handler)
+    def profiled(event, context):
+        global _run
+        if _run is not None:
+            # Already inside a profiled handler
+            return handler(event, context)
+
+        _run = _Run(handler.__name__)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            with profile_stage("handler"):
+                return handler(event, context)
+        finally:
+            run, _run = _run, None
+            if started_tracing:
+                tracemalloc.stop()
+            logger.info(_summarize(run))
+            try:
+                _dump(run)
+            except Exception as e:
+                logger.error(f"Error writing profiles: {str(e)}")
+
+    return profiled
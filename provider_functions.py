@@ -0,0 +1,280 @@
+import json
+import logging
+import random
+import threading
+import time
+from ai_functions import chat_completion_pplx, chat_completion_openai, ProviderError
+from config import PROVIDERS, PROVIDER_EWMA_ALPHA, PROVIDER_EXPECTED_LATENCY, PROVIDER_RECOVERY_SECONDS
+from history_functions import record_model_usage
+from tier_functions import estimate_tokens, estimate_cost
+from quota_functions import get_governor, expected_output_tokens, QuotaError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class Provider:
+    """
+    A service that fills a pipeline role: "research" or "formatting".
+
+    Research providers return a Perplexity-style response dict with 'choices' and
+    'citations'. Formatting providers return the formatted JSON text.
+    """
+    def __init__(self, name, role, models, expected_latency=PROVIDER_EXPECTED_LATENCY):
+        self.name = name
+        self.role = role
+        self.models = list(models)
+        self.expected_latency = expected_latency
+
+    def supports(self, model):
+        return model in self.models
+
+    def complete(self, model, system_message, user_message, response_format=None):
+        """
+        Run one completion.
+
+        Raises:
+            ProviderError: If the call fails
+        """
+        raise NotImplementedError
+
+    def usage(self, result, system_message, user_message):
+        """
+        Token usage of a completion, estimated from the text when the provider doesn't report it.
+
+        Returns:
+            tuple: (input tokens, output tokens)
+        """
+        if isinstance(result, dict):
+            reported = result.get("usage") or {}
+            if "prompt_tokens" in reported and "completion_tokens" in reported:
+                return reported["prompt_tokens"], reported["completion_tokens"]
+            output = result["choices"][0]["message"]["content"]
+        else:
+            output = str(result)
+        return estimate_tokens(system_message + user_message), estimate_tokens(output)
+
+class PerplexityProvider(Provider):
+    """Research with the Perplexity API"""
+    def complete(self, model, system_message, user_message, response_format=None):
+        return chat_completion_pplx(model, system_message, user_message, response_format)
+
+class OpenAIProvider(Provider):
+    """Formatting with the OpenAI API"""
+    def complete(self, model, system_message, user_message, response_format=None):
+        return chat_completion_openai(model, system_message, user_message, response_format)
+
+class FakeProvider(Provider):
+    """
+    Offline provider for testing and benchmarking routing.
+
+    Sleeps for latency seconds (plus up to jitter) and fails with the given
+    probability. Returns the canned content (and citations, for research), or a
+    minimal valid response for its role.
+    """
+    def __init__(self, name, role, models, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 content=None, citations=None, seed=None, **kwargs):
+        super().__init__(name, role, models, **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.content = content
+        self.citations = list(citations or [])
+        self._random = random.Random(seed)
+
+    def complete(self, model, system_message, user_message, response_format=None):
+        time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.failure_rate:
+            raise ProviderError(f"Fake provider '{self.name}' failed")
+
+        if self.role == "research":
+            return {
+                "choices": [{"message": {"content": self.content or f"Fake research for: {user_message}"}}],
+                "citations": self.citations,
+            }
+        return self.content or json.dumps({"news_items": []})
+
+PROVIDER_TYPES = {
+    "perplexity": PerplexityProvider,
+    "openai": OpenAIProvider,
+    "fake": FakeProvider,
+}
+
+class ProviderHealth:
+    """
+    Exponentially weighted moving averages of a provider's latency and error rate.
+
+    Errors are forgotten once the provider has not been called for recovery_seconds,
+    so a provider demoted by an outage is tried again later.
+    """
+    def __init__(self, expected_latency, alpha=PROVIDER_EWMA_ALPHA, recovery_seconds=PROVIDER_RECOVERY_SECONDS):
+        self.alpha = alpha
+        self.recovery_seconds = recovery_seconds
+        self.latency = expected_latency
+        self.error_rate = 0.0
+        self.calls = 0
+        self.last_call = None
+
+    def record(self, latency, failed):
+        self.calls += 1
+        self.last_call = time.monotonic()
+        self.latency += self.alpha * (latency - self.latency)
+        self.error_rate += self.alpha * ((1.0 if failed else 0.0) - self.error_rate)
+
+    @property
+    def score(self):
+        """Expected time per successful call; lower is healthier"""
+        if self.last_call is not None and time.monotonic() - self.last_call > self.recovery_seconds:
+            return self.latency
+        return self.latency / max(1.0 - self.error_rate, 0.05)
+
+class ProviderRouter:
+    """
+    Routes calls for one role to the healthiest provider, failing over to the next.
+
+    Providers are tried in order of expected time per successful call, from their
+    EWMA latency and error rate. Every call, successful or not, updates the health
+    of the provider that made it, and successful calls record the model's latency,
+    token usage and cost in the run history. With a quota governor, calls first
+    queue for their provider's quota; a provider whose queue is too long is skipped.
+    """
+    def __init__(self, role, providers, governor=None):
+        self.role = role
+        self.providers = list(providers)
+        self.governor = governor
+        self.health = {provider.name: ProviderHealth(provider.expected_latency) for provider in self.providers}
+        self._lock = threading.Lock()
+
+    def ranked(self, model=None):
+        """
+        Order providers for a call, healthiest first.
+
+        Providers that serve the requested model come before those that don't.
+
+        Args:
+            model: The requested model (any model if None)
+
+        Returns:
+            list: The providers in the order to try them
+        """
+        with self._lock:
+            scores = {name: health.score for name, health in self.health.items()}
+        return sorted(
+            self.providers,
+            key=lambda provider: (model is not None and not provider.supports(model), scores[provider.name])
+        )
+
+    def call(self, system_message, user_message, response_format=None, model=None):
+        """
+        Run a completion on the healthiest provider, failing over on errors.
+
+        Providers that don't serve the requested model use their own default model.
+
+        Args:
+            system_message: The system message
+            user_message: The user message
+            response_format: Optional format of the response
+            model: The preferred model (each provider's default if None)
+
+        Returns:
+            The provider's response
+
+        Raises:
+            ProviderError: The last provider's error, if every provider fails
+        """
+        last_error = None
+        for provider in self.ranked(model):
+            provider_model = model if model is not None and provider.supports(model) else provider.models[0]
+            reservation = None
+            if self.governor:
+                try:
+                    reservation = self.governor.acquire(
+                        provider.name, provider_model,
+                        estimate_tokens(system_message + user_message) + expected_output_tokens(provider_model)
+                    )
+                except QuotaError as e:
+                    logger.warning(f"{self.role.capitalize()} provider '{provider.name}' is out of quota, trying the next one: {str(e)}")
+                    last_error = e
+                    continue
+
+            started_at = time.monotonic()
+            try:
+                result = provider.complete(provider_model, system_message, user_message, response_format)
+            except ProviderError as e:
+                self._record(provider, time.monotonic() - started_at, failed=True)
+                logger.warning(f"{self.role.capitalize()} provider '{provider.name}' failed, trying the next one: {str(e)}")
+                last_error = e
+                continue
+
+            latency = time.monotonic() - started_at
+            self._record(provider, latency, failed=False)
+            input_tokens, output_tokens = provider.usage(result, system_message, user_message)
+            if self.governor:
+                self.governor.settle(reservation, input_tokens + output_tokens)
+            record_model_usage(
+                provider_model, latency, input_tokens, output_tokens,
+                estimate_cost(self.role, provider_model, input_tokens, output_tokens)
+            )
+            return result
+
+        raise last_error or ProviderError(f"No {self.role} providers configured")
+
+    def _record(self, provider, latency, failed):
+        with self._lock:
+            health = self.health[provider.name]
+            health.record(latency, failed)
+            logger.info(
+                f"{self.role.capitalize()} provider '{provider.name}': {latency:.1f}s, failed: {failed}, "
+                f"EWMA latency {health.latency:.1f}s, error rate {health.error_rate:.2f}"
+            )
+
+def build_provider(role, config):
+    """
+    Build a provider from its PROVIDERS entry.
+
+    Args:
+        role: The role the provider fills
+        config: Dict with 'name', 'type', 'models' and any type-specific options
+
+    Returns:
+        Provider: The provider
+    """
+    options = {key: value for key, value in config.items() if key not in ("name", "type", "models")}
+    return PROVIDER_TYPES[config["type"]](config["name"], role, config["models"], **options)
+
+_routers = {}
+
+def set_providers(role, providers):
+    """
+    Replace the providers of a role, e.g. with fake providers for offline runs.
+
+    Args:
+        role: "research" or "formatting"
+        providers: The Provider instances, or PROVIDERS-style config dicts
+
+    Returns:
+        ProviderRouter: The new router
+    """
+    _routers[role] = ProviderRouter(role, [
+        provider if isinstance(provider, Provider) else build_provider(role, provider)
+        for provider in providers
+    ], get_governor())
+    return _routers[role]
+
+def get_router(role):
+    """
+    Get the shared router for a role, built from PROVIDERS on first use.
+
+    Health is kept for as long as the process (or warm Lambda container) lives.
+
+    Args:
+        role: "research" or "formatting"
+
+    Returns:
+        ProviderRouter: The router
+    """
+    if role not in _routers:
+        _routers[role] = ProviderRouter(
+            role, [build_provider(role, config) for config in PROVIDERS[role]], get_governor()
+        )
+    return _routers[role]
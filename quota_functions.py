@@ -0,0 +1,256 @@
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+from ai_functions import ProviderError
+from config import QUOTAS, QUOTA_FILE, QUOTA_TABLE, QUOTA_MAX_WAIT, QUOTA_DEFAULT_OUTPUT_TOKENS
+from history_functions import load_run_history
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Optimistic writes retried this many times when other invocations update the same bucket
+MAX_WRITE_CONFLICTS = 20
+
+class QuotaError(ProviderError):
+    """Raised when a call would have to wait longer than QUOTA_MAX_WAIT for quota"""
+    pass
+
+class QuotaBackend:
+    """
+    Shared store of quota buckets with DynamoDB-style conditional writes.
+
+    Each item is stored with a version number; a write only succeeds if the version
+    is still the one that was read, so concurrent invocations never lose updates.
+    """
+    def get(self, key):
+        """
+        Read an item.
+
+        Returns:
+            tuple: (item dict, version), or (None, None) if there is no item yet
+        """
+        raise NotImplementedError
+
+    def put(self, key, item, expected_version):
+        """
+        Write an item if its version is still expected_version (None: if it doesn't exist yet).
+
+        Returns:
+            bool: Whether the write succeeded
+        """
+        raise NotImplementedError
+
+class SQLiteQuotaBackend(QuotaBackend):
+    """Quota buckets in a local SQLite file, shared by processes on one machine through SQLite's file locks"""
+    def __init__(self, filename=QUOTA_FILE):
+        self.filename = filename
+        with contextlib.closing(self._connect()) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, item TEXT NOT NULL, version INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.filename, timeout=30, isolation_level=None)
+
+    def get(self, key):
+        with contextlib.closing(self._connect()) as connection:
+            row = connection.execute("SELECT item, version FROM buckets WHERE key = ?", (key,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def put(self, key, item, expected_version):
+        with contextlib.closing(self._connect()) as connection:
+            if expected_version is None:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO buckets (key, item, version) VALUES (?, ?, 1)", (key, json.dumps(item))
+                )
+            else:
+                cursor = connection.execute(
+                    "UPDATE buckets SET item = ?, version = version + 1 WHERE key = ? AND version = ?",
+                    (json.dumps(item), key, expected_version)
+                )
+        return cursor.rowcount == 1
+
+class DynamoDBQuotaBackend(QuotaBackend):
+    """
+    Quota buckets in a DynamoDB table, shared by every Lambda invocation.
+
+    The table needs a string partition key named "key".
+    """
+    def __init__(self, table_name=QUOTA_TABLE):
+        import boto3  # Provided by the Lambda runtime
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.conflict = self.table.meta.client.exceptions.ConditionalCheckFailedException
+
+    def get(self, key):
+        item = self.table.get_item(Key={"key": key}, ConsistentRead=True).get("Item")
+        return (json.loads(item["state"]), int(item["version"])) if item else (None, None)
+
+    def put(self, key, item, expected_version):
+        if expected_version is None:
+            condition = {"ConditionExpression": "attribute_not_exists(#key)", "ExpressionAttributeNames": {"#key": "key"}}
+        else:
+            condition = {"ConditionExpression": "version = :version", "ExpressionAttributeValues": {":version": expected_version}}
+        try:
+            self.table.put_item(
+                Item={"key": key, "state": json.dumps(item), "version": (expected_version or 0) + 1}, **condition
+            )
+            return True
+        except self.conflict:
+            return False
+
+def expected_output_tokens(model, history=None):
+    """Mean recorded output tokens of a model, or QUOTA_DEFAULT_OUTPUT_TOKENS if it has none yet"""
+    history = history if history is not None else load_run_history()
+    recorded = history.get("models", {}).get(model, {}).get("output_tokens")
+    return sum(recorded) / len(recorded) if recorded else QUOTA_DEFAULT_OUTPUT_TOKENS
+
+class QuotaGovernor:
+    """
+    Requests-per-minute and tokens-per-minute token buckets for each provider and model.
+
+    A call reserves one request and its estimated tokens right away, even if that
+    takes a bucket below zero, then sleeps until the bucket has refilled to zero.
+    Calls therefore queue in the order they arrived, across every invocation that
+    shares the backend. Token reservations are settled against the actual usage
+    once the call returns.
+    """
+    def __init__(self, backend, quotas=QUOTAS, max_wait=QUOTA_MAX_WAIT, clock=time.time, sleep=time.sleep):
+        self.backend = backend
+        self.quotas = quotas
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+
+    def limits(self, provider, model):
+        """Quota of a provider's model: its "provider:model" entry in QUOTAS, else the provider's entry"""
+        return self.quotas.get(f"{provider}:{model}") or self.quotas.get(provider)
+
+    def _update(self, key, limits, change):
+        """
+        Refill a bucket and apply a change to it with a conditional write, retrying on conflicts.
+
+        Args:
+            key: The bucket key
+            limits: The bucket's quota
+            change: Function taking the refilled (requests, tokens) and returning the new values,
+                    or raising QuotaError to leave the bucket unchanged
+
+        Returns:
+            tuple: The new (requests, tokens)
+        """
+        rpm = limits.get("requests_per_minute")
+        tpm = limits.get("tokens_per_minute")
+        request_capacity = limits.get("burst") or rpm or 0
+        token_capacity = tpm or 0
+
+        for _ in range(MAX_WRITE_CONFLICTS):
+            item, version = self.backend.get(key)
+            now = self.clock()
+            if item is None:
+                requests, tokens = request_capacity, token_capacity
+            else:
+                # Invocations on other machines may have clocks slightly behind this one's
+                now = max(now, item["updated"])
+                elapsed = now - item["updated"]
+                requests = min(request_capacity, item["requests"] + elapsed * (rpm or 0) / 60)
+                tokens = min(token_capacity, item["tokens"] + elapsed * (tpm or 0) / 60)
+
+            requests, tokens = change(requests, tokens)
+            if self.backend.put(key, {"requests": requests, "tokens": tokens, "updated": now}, version):
+                return requests, tokens
+        raise QuotaError(f"Too much contention on quota bucket {key}")
+
+    def acquire(self, provider, model, tokens):
+        """
+        Reserve quota for a call, waiting until it is available.
+
+        Args:
+            provider: The provider name
+            model: The model called
+            tokens: Estimated tokens of the call, prompt and completion
+
+        Returns:
+            dict: The reservation to settle after the call, or None if the model has no quota
+            or the backend can't be reached
+
+        Raises:
+            QuotaError: If the call would have to wait longer than max_wait
+        """
+        limits = self.limits(provider, model)
+        if not limits:
+            return None
+        rpm = limits.get("requests_per_minute")
+        tpm = limits.get("tokens_per_minute")
+        tokens = min(tokens, tpm) if tpm else tokens
+        key = f"{provider}:{model}"
+        waits = {}
+
+        def reserve(requests, available_tokens):
+            requests -= 1 if rpm else 0
+            available_tokens -= tokens if tpm else 0
+            waits["requests"] = -requests * 60 / rpm if rpm and requests < 0 else 0.0
+            waits["tokens"] = -available_tokens * 60 / tpm if tpm and available_tokens < 0 else 0.0
+            if max(waits.values()) > self.max_wait:
+                raise QuotaError(
+                    f"Quota for {key} would take {max(waits.values()):.0f}s to free up (limit {self.max_wait}s)"
+                )
+            return requests, available_tokens
+
+        try:
+            self._update(key, limits, reserve)
+        except QuotaError:
+            raise
+        except Exception as e:
+            # An unreachable or misconfigured backend shouldn't stop the call (or fail over to
+            # providers that would hit the same backend), so it goes ahead ungoverned
+            logger.error(f"Quota backend unavailable, calling {key} without quota: {str(e)}")
+            return None
+        wait = max(waits.values())
+        if wait > 0:
+            limit = "requests" if waits["requests"] >= waits["tokens"] else "tokens"
+            logger.info(f"Waiting {wait:.1f}s for {limit} per minute quota of {key}")
+            self.sleep(wait)
+        return {"key": key, "provider": provider, "model": model, "tokens": tokens if tpm else 0}
+
+    def settle(self, reservation, actual_tokens):
+        """
+        Correct a reservation's token estimate with the tokens the call actually used.
+
+        Args:
+            reservation: The reservation returned by acquire
+            actual_tokens: Prompt and completion tokens used
+        """
+        if not reservation or not reservation["tokens"]:
+            return
+        limits = self.limits(reservation["provider"], reservation["model"])
+        difference = reservation["tokens"] - actual_tokens
+        if difference:
+            try:
+                self._update(reservation["key"], limits, lambda requests, tokens: (requests, tokens + difference))
+            except Exception as e:
+                logger.error(f"Quota backend unavailable, {reservation['key']} reservation not settled: {str(e)}")
+
+_governor = None
+_governor_failed = False
+
+def get_governor():
+    """
+    Get the shared quota governor, on DynamoDB if QUOTA_TABLE is set and on SQLite otherwise.
+
+    Returns:
+        QuotaGovernor: The governor, or None if its backend can't be opened, in which case
+        calls go ahead ungoverned
+    """
+    global _governor, _governor_failed
+    if _governor is None and not _governor_failed:
+        try:
+            backend = DynamoDBQuotaBackend(QUOTA_TABLE) if QUOTA_TABLE else SQLiteQuotaBackend(QUOTA_FILE)
+        except Exception as e:
+            logger.error(f"Can't open quota backend {QUOTA_TABLE or QUOTA_FILE}, calls won't be governed: {str(e)}")
+            _governor_failed = True
+            return None
+        _governor = QuotaGovernor(backend)
+    return _governor
@@ -0,0 +1,189 @@
+import datetime
+import logging
+import math
+import re
+from collections import Counter
+from config import RANKING_RECENCY_WEIGHT, RANKING_RECENCY_HALF_LIFE_DAYS
+from news_models import NewsCategory, NewsResponse
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Common words, and words from query prompts that say nothing about the topic
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "their", "this", "to", "was", "were", "will", "with",
+    "what", "which", "who", "should", "could", "would", "not", "don", "t", "s", "any", "all", "such",
+    "get", "top", "latest", "news", "include", "included", "description", "descriptive", "date",
+    "dates", "published", "focus", "outside", "frame", "prompt", "major", "events", "items", "outputs",
+}
+
+DATE_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?P<iso>\d{4}-\d{2}-\d{2})"
+    r"|(?P<mdy>[A-Z][a-z]{2,8}\.? \d{1,2},? \d{4})"
+    r"|(?P<dmy>\d{1,2} [A-Z][a-z]{2,8},? \d{4})"
+    r")\b"
+)
+DATE_FORMATS = ("%Y-%m-%d", "%b %d %Y", "%B %d %Y", "%d %b %Y", "%d %B %Y")
+
+def tokenize(text):
+    """Lower-case terms of a text, without stop words"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOP_WORDS]
+
+def bm25_scores(query, documents, k1=1.5, b=0.75):
+    """
+    Score documents against a query with Okapi BM25.
+
+    Term statistics are computed once for the whole collection, and each document
+    is scored only over the query terms it contains.
+
+    Args:
+        query: The query text
+        documents: The document texts
+        k1: Term frequency saturation
+        b: Document length normalization
+
+    Returns:
+        list: One score per document
+    """
+    if not documents:
+        return []
+
+    term_counts = [Counter(tokenize(document)) for document in documents]
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = sum(lengths) / len(lengths) or 1
+
+    query_terms = set(tokenize(query))
+    document_frequency = Counter(term for counts in term_counts for term in query_terms.intersection(counts))
+    count = len(documents)
+    idf = {
+        term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+        for term, frequency in document_frequency.items()
+    }
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        norm = k1 * (1 - b + b * length / average_length)
+        scores.append(sum(
+            weight * counts[term] * (k1 + 1) / (counts[term] + norm)
+            for term, weight in idf.items() if term in counts
+        ))
+    return scores
+
+def extract_date(text):
+    """
+    Find the first date mentioned in a text, e.g. "Oct 17, 2026" or "2026-10-17".
+
+    Returns:
+        datetime.datetime: The date, or None if the text mentions none
+    """
+    for match in DATE_PATTERN.finditer(text):
+        value = match.group(0).replace(",", "").replace(".", "")
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+    return None
+
+def recency_score(date, now=None):
+    """Score from 1 (today) halving every RANKING_RECENCY_HALF_LIFE_DAYS; 0 for unknown dates"""
+    if date is None:
+        return 0.0
+    age_days = max(((now or datetime.datetime.now()) - date).total_seconds() / 86400, 0)
+    return 0.5 ** (age_days / RANKING_RECENCY_HALF_LIFE_DAYS)
+
+def rank_news_items(news_response, description, now=None):
+    """
+    Rank every news item of a digest by relevance to the query and recency.
+
+    Relevance is the BM25 score of the item's title (counted twice) and description
+    against the query description, scaled to 0-1. Recency comes from the date the
+    description mentions. They are combined with RANKING_RECENCY_WEIGHT.
+
+    Args:
+        news_response: The NewsResponse to rank
+        description: The query description, with dates filled in
+        now: The time to measure recency against (defaults to now)
+
+    Returns:
+        list: (category index, item index) positions, best first
+    """
+    positions = [
+        (category_index, item_index)
+        for category_index, category in enumerate(news_response.news_items)
+        for item_index in range(len(category.news_items))
+    ]
+    items = [news_response.news_items[c].news_items[i] for c, i in positions]
+
+    relevance = bm25_scores(description, [f"{item.title} {item.title} {item.description}" for item in items])
+    top_relevance = max(relevance, default=0) or 1
+    scores = [
+        (1 - RANKING_RECENCY_WEIGHT) * score / top_relevance
+        + RANKING_RECENCY_WEIGHT * recency_score(extract_date(item.description), now)
+        for score, item in zip(relevance, items)
+    ]
+    return [position for _, position in sorted(zip(scores, positions), key=lambda pair: -pair[0])]
+
+def select_news_items(news_response, positions):
+    """
+    Keep only the news items at the given positions, in their original order.
+
+    Args:
+        news_response: The NewsResponse to trim
+        positions: (category index, item index) positions to keep
+
+    Returns:
+        NewsResponse: The trimmed digest, without empty categories
+    """
+    keep = set(positions)
+    categories = []
+    for category_index, category in enumerate(news_response.news_items):
+        news_items = [
+            item for item_index, item in enumerate(category.news_items)
+            if (category_index, item_index) in keep
+        ]
+        if news_items:
+            categories.append(NewsCategory(category=category.category, news_items=news_items))
+    return NewsResponse(news_items=categories)
+
+def trim_news_response(news_response, description, render, max_items=None, max_parts=None):
+    """
+    Keep the best news items of a digest within an item cap and a message part cap.
+
+    Args:
+        news_response: The NewsResponse to trim
+        description: The query description, with dates filled in
+        render: Function rendering a NewsResponse into message parts
+        max_items: Maximum number of news items (no limit if None)
+        max_parts: Maximum number of message parts (no limit if None)
+
+    Returns:
+        NewsResponse: The trimmed digest
+    """
+    ranked = rank_news_items(news_response, description)
+    total = len(ranked)
+    if max_items is not None:
+        ranked = ranked[:max_items]
+
+    trimmed = select_news_items(news_response, ranked)
+    if max_parts is not None and len(render(trimmed)) > max_parts:
+        # Find the most items that still fit in max_parts
+        low, high = 1, len(ranked) - 1
+        best = select_news_items(news_response, ranked[:1])
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = select_news_items(news_response, ranked[:middle])
+            if len(render(candidate)) <= max_parts:
+                best, low = candidate, middle + 1
+            else:
+                high = middle - 1
+        trimmed = best
+
+    kept = sum(len(category.news_items) for category in trimmed.news_items)
+    if kept < total:
+        logger.info(f"Trimmed digest from {total} to {kept} news items")
+    return trimmed
@@ -0,0 +1,261 @@
+import html
+import logging
+import re
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Telegram's limit on message text after entity parsing, in UTF-16 code units
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Anything shaped like a tag; sanitize_html keeps only well-formed Telegram tags and escapes
+# the rest, so in sanitized text every match is a real tag
+TAG_PATTERN = re.compile(r"</?[a-zA-Z][\w-]*(?:\s[^<>]*)?/?>")
+ENTITY_PATTERN = re.compile(r"&(?:#[0-9]+|#x[0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);")
+TOKEN_PATTERN = re.compile(f"({TAG_PATTERN.pattern}|{ENTITY_PATTERN.pattern})")
+WORD_PATTERN = re.compile(r"\S+\s*|\s+")
+TAG_NAME_PATTERN = re.compile(r"</?\s*([a-zA-Z][a-zA-Z0-9-]*)")
+
+class RenderError(Exception):
+    """Custom exception for message rendering errors"""
+    pass
+
+def utf16_length(text):
+    """Length of text in UTF-16 code units, the unit Telegram counts in"""
+    return len(text.encode("utf-16-le")) // 2
+
+@lru_cache(maxsize=1024)
+def _entity_length(entity):
+    return utf16_length(html.unescape(entity))
+
+def tokenize_html(text):
+    """
+    Split Telegram HTML into tag, entity and text tokens.
+
+    Args:
+        text: The HTML message text
+
+    Returns:
+        list: (kind, value) tuples, where kind is "tag", "entity" or "text"
+    """
+    tokens = []
+    for i, value in enumerate(TOKEN_PATTERN.split(text)):
+        if not value:
+            continue
+        if i % 2 == 0:
+            tokens.append(("text", value))
+        elif value.startswith("<"):
+            tokens.append(("tag", value))
+        else:
+            tokens.append(("entity", value))
+    return tokens
+
+def tag_name(tag):
+    """Lower-case name of an HTML tag token, e.g. "b" for "</b>" """
+    match = TAG_NAME_PATTERN.match(tag)
+    return match.group(1).lower() if match else ""
+
+def telegram_length(text):
+    """
+    Measure a message the way Telegram does: after entity parsing, in UTF-16 code units.
+
+    Tags don't count towards the limit and entities such as &amp; count as the
+    character they stand for.
+
+    Args:
+        text: The HTML message text
+
+    Returns:
+        int: The message length Telegram checks against its limit
+    """
+    if "<" in text:
+        text = TAG_PATTERN.sub("", text)
+    length = utf16_length(text)
+    if "&" in text:
+        for entity in ENTITY_PATTERN.findall(text):
+            length += _entity_length(entity) - len(entity)
+    return length
+
+def _atoms(text):
+    """Break HTML into unsplittable pieces: tags, entities and words with their trailing whitespace"""
+    atoms = []
+    for kind, value in tokenize_html(text):
+        if kind == "text":
+            atoms.extend(("text", word) for word in WORD_PATTERN.findall(value))
+        else:
+            atoms.append((kind, value))
+    return atoms
+
+def _split_word(word, limit):
+    """Split a single word longer than the limit between code points"""
+    pieces = []
+    start = 0
+    size = 0
+    for i, char in enumerate(word):
+        char_size = utf16_length(char)
+        if char_size > limit:
+            raise RenderError(f"Cannot fit message content within {limit} characters")
+        if size + char_size > limit:
+            pieces.append(word[start:i])
+            start = i
+            size = 0
+        size += char_size
+    pieces.append(word[start:])
+    return pieces
+
+def split_html(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Split Telegram HTML into chunks that each fit within the limit.
+
+    Chunks are never split inside a tag, an entity or a character, and break at a
+    line end where one is reasonably close to the limit, otherwise between words.
+    Tags open at a break are closed at the end of the chunk and reopened at the
+    start of the next one.
+
+    Args:
+        text: The HTML message text
+        limit: Maximum Telegram length of each chunk
+
+    Returns:
+        list: The chunks, in order
+
+    Raises:
+        RenderError: If the limit is too small to make progress
+    """
+    if telegram_length(text) <= limit:
+        return [text]
+
+    atoms = _atoms(text)
+    chunks = []
+    stack = []  # (name, opening tag) of the tags open at the current position
+    i = 0
+
+    while i < len(atoms):
+        parts = [opening for _, opening in stack]
+        chunk_stack = list(stack)
+        size = 0
+        last_break = None
+        start = i
+
+        while i < len(atoms):
+            kind, value = atoms[i]
+            if kind == "tag":
+                name = tag_name(value)
+                if value.startswith("</"):
+                    for depth in range(len(chunk_stack) - 1, -1, -1):
+                        if chunk_stack[depth][0] == name:
+                            del chunk_stack[depth:]
+                            break
+                elif not value.endswith("/>"):
+                    chunk_stack.append((name, value))
+                parts.append(value)
+                i += 1
+                continue
+
+            atom_size = _entity_length(value) if kind == "entity" else utf16_length(value)
+            if size + atom_size > limit:
+                if kind == "text" and size == 0:
+                    # A single word longer than the limit
+                    pieces = _split_word(value, limit)
+                    atoms[i:i + 1] = [("text", piece) for piece in pieces]
+                    continue
+                break
+
+            parts.append(value)
+            size += atom_size
+            i += 1
+            if kind == "text" and value.endswith("\n"):
+                last_break = (len(parts), i, list(chunk_stack), size)
+
+        if i == start and size == 0:
+            raise RenderError(f"Cannot fit message content within {limit} characters")
+
+        # Prefer to break at a line end if it keeps at least half the chunk
+        if i < len(atoms) and last_break and last_break[3] >= limit // 2:
+            parts_end, i, chunk_stack, _ = last_break
+            parts = parts[:parts_end]
+
+        stack = chunk_stack
+        parts.extend(f"</{name}>" for name, _ in reversed(stack))
+        chunks.append("".join(parts))
+
+    return chunks
+
+def render_news_blocks(news_response, title, include_links=True, max_items_per_category=None):
+    """
+    Render a news digest as a list of HTML blocks that can be packed into messages.
+
+    A category header is kept in the same block as the category's first item so it
+    never ends up alone at the end of a message.
+
+    Args:
+        news_response: A NewsResponse (or any object with the same attributes)
+        title: The title of the query
+        include_links: Whether to include each news item's source link
+        max_items_per_category: Maximum number of news items shown per category (all if None)
+
+    Returns:
+        list: The HTML blocks, in order
+    """
+    blocks = [f"Here are the top {title} news for you:\n\n"]
+
+    for category in news_response.news_items:
+        category_blocks = []
+        for item in category.news_items[:max_items_per_category]:
+            parts = ["<b>", item.title, "</b>\n", item.description, "\n"]
+            if include_links and item.link:
+                parts.extend([item.link, "\n"])
+            parts.append("\n")
+            category_blocks.append("".join(parts))
+
+        header = f"<b><u>📌 {category.category}</u></b>\n\n"
+        if category_blocks:
+            category_blocks[0] = header + category_blocks[0]
+            category_blocks[-1] += "\n\n"
+        else:
+            category_blocks = [header + "\n\n"]
+        blocks.extend(category_blocks)
+
+    return blocks
+
+def pack_blocks(blocks, limit):
+    """
+    Pack HTML blocks into as few messages as possible, keeping their order.
+
+    With blocks in a fixed order, filling each message before starting the next
+    one gives the minimum number of messages. Blocks larger than the limit are
+    split with split_html.
+
+    Args:
+        blocks: The HTML blocks, each with balanced tags
+        limit: Maximum Telegram length of each message
+
+    Returns:
+        list: The messages
+    """
+    messages = []
+    current = []
+    current_size = 0
+
+    for block in blocks:
+        block_size = telegram_length(block)
+        if block_size > limit:
+            pieces = split_html(block, limit)
+        else:
+            pieces = [block]
+
+        for piece in pieces:
+            piece_size = block_size if len(pieces) == 1 else telegram_length(piece)
+            if current and current_size + piece_size > limit:
+                messages.append("".join(current))
+                current = []
+                current_size = 0
+            current.append(piece)
+            current_size += piece_size
+
+    if current:
+        messages.append("".join(current))
+
+    return messages
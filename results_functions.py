@@ -0,0 +1,83 @@
+import datetime
+import logging
+from config import RESULTS_STORE_FILE, RESULTS_RETENTION_DAYS
+from json_functions import JSONProcessingError
+from state_functions import load_state, update_state
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+class ResultsStoreError(Exception):
+    """Custom exception for results store errors"""
+    pass
+
+def load_stored_items(tags=None, since=None, until=None, filename=None):
+    """
+    Load stored news items, optionally filtered by query tag and time window.
+    
+    The store is read from STATE_BUCKET if set, so rollups see the items stored by
+    the other scheduled functions, and from disk otherwise.
+    
+    Args:
+        tags: Query tags to include (all tags if None)
+        since: Only include items stored at or after this time
+        until: Only include items stored before this time
+        filename: The results store file (defaults to RESULTS_STORE_FILE)
+        
+    Returns:
+        list: Stored items as dicts with query, category, title, description, link and stored_at keys
+    """
+    try:
+        items = load_state(filename or RESULTS_STORE_FILE, lambda: {"items": []}).get("items", [])
+    except JSONProcessingError as e:
+        logger.error(f"Error loading results store: {str(e)}")
+        return []
+    
+    since = since.isoformat() if since else None
+    until = until.isoformat() if until else None
+    return [
+        item for item in items
+        if (tags is None or item["query"] in tags)
+        and (since is None or item["stored_at"] >= since)
+        and (until is None or item["stored_at"] < until)
+    ]
+
+def store_news_response(news_response, query_tag, stored_at=None, filename=None):
+    """
+    Add every item of a validated NewsResponse to the results store.
+    
+    Items older than RESULTS_RETENTION_DAYS are dropped on every write. The store is
+    updated under a lock (or a conditional write in STATE_BUCKET), so concurrent runs
+    never drop each other's items, and a store that can't be read is never overwritten.
+    
+    Args:
+        news_response: The NewsResponse to store
+        query_tag: The run history key of the query that produced it
+        stored_at: The time to store the items under (defaults to now)
+        filename: The results store file (defaults to RESULTS_STORE_FILE)
+        
+    Raises:
+        ResultsStoreError: If the store can't be written
+    """
+    stored_at = (stored_at or datetime.datetime.now()).isoformat()
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=RESULTS_RETENTION_DAYS)).isoformat()
+    new_items = [
+        {
+            "query": query_tag,
+            "category": category.category,
+            "title": news_item.title,
+            "description": news_item.description,
+            "link": news_item.link,
+            "stored_at": stored_at,
+        }
+        for category in news_response.news_items for news_item in category.news_items
+    ]
+    
+    def add(store):
+        store["items"] = [item for item in store.get("items", []) if item["stored_at"] >= cutoff] + new_items
+    
+    try:
+        update_state(filename or RESULTS_STORE_FILE, add, lambda: {"items": []})
+    except JSONProcessingError as e:
+        raise ResultsStoreError(f"Error saving results store: {str(e)}")
@@ -0,0 +1,141 @@
+import datetime
+import logging
+import re
+from config import ROLLUP_MAX_ITEMS
+from news_models import NewsItem, NewsCategory, NewsResponse
+from ranking_functions import bm25_scores
+from results_functions import load_stored_items
+from link_functions import link_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]{3,}")
+
+def _words(text):
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def _story_key(item):
+    """Key used to recognise the same story stored by several runs"""
+    return link_key(item["link"]) or " ".join(sorted(_words(item["title"])))
+
+def rank_stored_items(items, description, now=None):
+    """
+    Deduplicate stored items and rank them for a rollup digest.
+    
+    Items score for their BM25 relevance to the query description, for being
+    reported by several runs, and for being recent.
+    
+    Args:
+        items: Stored items from the results store
+        description: The rollup query's description
+        now: The time to measure recency against (defaults to now)
+        
+    Returns:
+        list: Unique items, best first
+    """
+    now = now or datetime.datetime.now()
+    
+    stories = {}
+    for item in items:
+        key = _story_key(item)
+        if key in stories:
+            story = stories[key]
+            story["mentions"] += 1
+            # Keep the most recent write-up of the story
+            if item["stored_at"] > story["item"]["stored_at"]:
+                story["item"] = item
+        else:
+            stories[key] = {"item": item, "mentions": 1}
+    
+    stories = list(stories.values())
+    relevance = bm25_scores(description, [
+        f"{story['item']['title']} {story['item']['title']} {story['item']['description']}" for story in stories
+    ])
+    
+    def score(story, relevance):
+        item = story["item"]
+        age_days = (now - datetime.datetime.fromisoformat(item["stored_at"])).total_seconds() / 86400
+        recency = 1 / (1 + max(age_days, 0))
+        return relevance + story["mentions"] + recency
+    
+    ranked = sorted(zip(stories, relevance), key=lambda pair: score(*pair), reverse=True)
+    return [story["item"] for story, _ in ranked]
+
+def build_rollup_response(query, since, max_items=ROLLUP_MAX_ITEMS):
+    """
+    Build a digest for a rollup query from the results store, without any API call.
+    
+    Args:
+        query: The query configuration, with a 'rollup' section listing the query tags to roll up
+        since: Start of the rollup window
+        max_items: Maximum number of news items in the digest
+        
+    Returns:
+        NewsResponse: The best stored items in the window, grouped by category in rank order
+    """
+    tags = query["rollup"].get("tags")
+    items = load_stored_items(tags=tags, since=since)
+    ranked = rank_stored_items(items, query["description"])[:max_items]
+    logger.info(f"Rolled up {len(ranked)} of {len(items)} stored items for '{query['title']}'")
+    
+    categories = {}
+    for item in ranked:
+        categories.setdefault(item["category"], []).append(
+            NewsItem(title=item["title"], description=item["description"], link=item["link"])
+        )
+    
+    return NewsResponse(news_items=[
+        NewsCategory(category=category, news_items=news_items)
+        for category, news_items in categories.items()
+    ])
+
+def build_gap_fill_prompt(description, rollup_response):
+    """
+    Build the research prompt for news the rollup digest is missing.
+    
+    Args:
+        description: The rollup query's description, with dates already filled in
+        rollup_response: The digest built from stored items
+        
+    Returns:
+        str: A prompt asking only for news not already covered
+    """
+    covered = [item.title for category in rollup_response.news_items for item in category.news_items]
+    if not covered:
+        return description
+    
+    covered_list = "\n".join(f"- {title}" for title in covered)
+    return (
+        f"{description}\n\n"
+        f"The following stories are already covered, do not repeat them:\n{covered_list}\n\n"
+        f"Only include important news that is missing from this list. Keep it to a few items."
+    )
+
+def merge_news_responses(primary, extra):
+    """
+    Merge the categories of two digests, keeping the primary digest's order.
+    
+    Args:
+        primary: The main NewsResponse
+        extra: A NewsResponse with additional items
+        
+    Returns:
+        NewsResponse: The merged digest, without duplicate links
+    """
+    seen_links = {link_key(item.link) for category in primary.news_items for item in category.news_items}
+    categories = {category.category: list(category.news_items) for category in primary.news_items}
+    
+    for category in extra.news_items:
+        for item in category.news_items:
+            key = link_key(item.link)
+            if key and key in seen_links:
+                continue
+            seen_links.add(key)
+            categories.setdefault(category.category, []).append(item)
+    
+    return NewsResponse(news_items=[
+        NewsCategory(category=category, news_items=news_items)
+        for category, news_items in categories.items()
+    ])
@@ -0,0 +1,206 @@
+import html
+import logging
+import re
+from news_models import NewsItem, NewsCategory, NewsResponse
+from render_functions import tokenize_html, tag_name
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Tags Telegram accepts with parse_mode "html"
+ALLOWED_TAGS = {
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
+    "a", "code", "pre", "span", "tg-spoiler", "tg-emoji", "blockquote",
+}
+# Telegram doesn't allow other entities inside these
+VERBATIM_TAGS = {"code", "pre"}
+# Named entities Telegram understands; all numeric entities are supported
+NAMED_ENTITIES = {"&lt;", "&gt;", "&amp;", "&quot;"}
+
+ATTRIBUTE_PATTERN = re.compile(r"""([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+# The only attribute Telegram accepts without a value, <blockquote expandable>
+BARE_ATTRIBUTE_PATTERN = re.compile(r"expandable\b")
+OPENING_TAG_PATTERN = re.compile(
+    rf"<[a-zA-Z][\w-]*(?:\s+(?:{ATTRIBUTE_PATTERN.pattern}|{BARE_ATTRIBUTE_PATTERN.pattern}))*\s*/?>"
+)
+CLOSING_TAG_PATTERN = re.compile(r"</[a-zA-Z][\w-]*\s*>")
+
+def _attributes(tag):
+    return {
+        match.group(1).lower(): next(value for value in match.groups()[1:] if value is not None)
+        for match in ATTRIBUTE_PATTERN.finditer(tag)
+    }
+
+def _is_tag(name, tag):
+    """
+    Whether a tag token is markup rather than text that looks like it, such as
+    "<NVDA>" or the "<y and z>" in "x<y and z>w".
+    """
+    if name != "br" and name not in ALLOWED_TAGS:
+        return False
+    pattern = CLOSING_TAG_PATTERN if tag.startswith("</") else OPENING_TAG_PATTERN
+    return pattern.fullmatch(tag) is not None
+
+def _clean_opening_tag(name, tag):
+    """
+    Rebuild an allowed opening tag with only the attributes Telegram accepts.
+
+    Returns:
+        str: The cleaned tag, or None if the tag is unusable
+    """
+    attributes = _attributes(tag)
+    if name == "a":
+        href = attributes.get("href", "")
+        if not href:
+            return None
+        return f'<a href="{html.escape(html.unescape(href))}">'
+    if name == "span":
+        return '<span class="tg-spoiler">' if attributes.get("class") == "tg-spoiler" else None
+    if name == "tg-emoji":
+        emoji_id = attributes.get("emoji-id", "")
+        return f'<tg-emoji emoji-id="{html.escape(emoji_id)}">' if emoji_id.isdigit() else None
+    if name == "code" and attributes.get("class", "").startswith("language-"):
+        return f'<code class="{html.escape(attributes["class"])}">'
+    if name == "blockquote" and re.search(r"\bexpandable\b", tag[len("<blockquote"):]):
+        return "<blockquote expandable>"
+    return f"<{name}>"
+
+def sanitize_html(text, allow_tags=True):
+    """
+    Make text safe to send with Telegram's HTML parse mode.
+
+    Stray <, > and & are escaped; only well-formed tags Telegram supports count as
+    tags, so text like "rates <3%", "Nvidia <NVDA>" or "x<y and z>w" is kept as
+    text. Unsupported named entities are replaced by their character, unbalanced
+    tags are closed and stray closing tags dropped. Tags inside <code> and <pre>
+    are stripped.
+
+    Args:
+        text: The text to sanitize
+        allow_tags: Whether to keep allowed tags; if False they are stripped
+
+    Returns:
+        tuple: (sanitized text, number of repairs made)
+    """
+    parts = []
+    stack = []
+    repairs = 0
+
+    for kind, value in tokenize_html(text):
+        if kind == "text":
+            escaped = html.escape(value, quote=False)
+            repairs += escaped != value
+            parts.append(escaped)
+
+        elif kind == "entity":
+            if value in NAMED_ENTITIES or value.startswith("&#"):
+                parts.append(value)
+            else:
+                replacement = html.escape(html.unescape(value), quote=False)
+                repairs += 1
+                parts.append(replacement)
+
+        else:
+            name = tag_name(value)
+            if not _is_tag(name, value):
+                parts.append(html.escape(value, quote=False))
+                repairs += 1
+                continue
+
+            if name == "br":
+                # Telegram has no line break tag
+                parts.append("\n")
+                repairs += 1
+                continue
+
+            inside_verbatim = any(open_name in VERBATIM_TAGS for open_name, _ in stack)
+            if not allow_tags or (inside_verbatim and name not in VERBATIM_TAGS):
+                repairs += 1
+                continue
+
+            if value.startswith("</"):
+                open_names = [open_name for open_name, _ in stack]
+                if name not in open_names:
+                    repairs += 1  # Stray closing tag
+                    continue
+                # Close any tags left open inside this one
+                while stack[-1][0] != name:
+                    parts.append(f"</{stack.pop()[0]}>")
+                    repairs += 1
+                parts.append(f"</{stack.pop()[0]}>")
+            else:
+                cleaned = _clean_opening_tag(name, value)
+                if cleaned is None:
+                    repairs += 1
+                    continue
+                repairs += cleaned != value
+                stack.append((name, cleaned))
+                parts.append(cleaned)
+
+    # Close tags left open at the end
+    while stack:
+        parts.append(f"</{stack.pop()[0]}>")
+        repairs += 1
+
+    return "".join(parts), repairs
+
+def sanitize_news_response(news_response):
+    """
+    Sanitize every text field of a NewsResponse for Telegram's HTML parse mode.
+
+    Titles, categories and links are rendered inside markup, so tags are stripped
+    from them; descriptions keep the tags Telegram allows.
+
+    Args:
+        news_response: The NewsResponse to sanitize
+
+    Returns:
+        tuple: (sanitized NewsResponse, number of repairs made)
+    """
+    repairs = 0
+
+    def clean(text, allow_tags=False):
+        nonlocal repairs
+        sanitized, count = sanitize_html(text, allow_tags)
+        repairs += count
+        return sanitized
+
+    sanitized = NewsResponse(news_items=[
+        NewsCategory(
+            category=clean(category.category),
+            news_items=[
+                NewsItem(
+                    title=clean(item.title),
+                    description=clean(item.description, allow_tags=True),
+                    link=clean(item.link)
+                )
+                for item in category.news_items
+            ]
+        )
+        for category in news_response.news_items
+    ])
+    return sanitized, repairs
+
+def sanitize_digest(formatted_json):
+    """
+    Sanitize a formatted digest before it is rendered and sent.
+
+    Args:
+        formatted_json: The formatted NewsResponse, or unformatted fallback content
+
+    Returns:
+        The sanitized digest, of the same type
+    """
+    if isinstance(formatted_json, NewsResponse):
+        sanitized, repairs = sanitize_news_response(formatted_json)
+    else:
+        sanitized, repairs = sanitize_html(str(formatted_json))
+
+    if repairs:
+        logger.warning(f"Repaired {repairs} Telegram HTML problems in the digest")
+    return sanitized
+
+def escape_html(text):
+    """Escape plain text, such as error messages, for Telegram's HTML parse mode"""
+    return html.escape(text, quote=False)
@@ -0,0 +1,70 @@
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def make_request_handler(endpoint):
+    """
+    Build an HTTP request handler that forwards requests to a Lambda function URL handler.
+    
+    Args:
+        endpoint: A Lambda handler taking a function URL event and a context
+        
+    Returns:
+        A BaseHTTPRequestHandler subclass
+    """
+    class EndpointRequestHandler(BaseHTTPRequestHandler):
+        def _handle(self):
+            url = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length", 0))
+            event = {
+                "rawPath": url.path,
+                "rawQueryString": url.query,
+                "headers": {key.lower(): value for key, value in self.headers.items()},
+                "requestContext": {"http": {"method": self.command, "path": url.path}},
+                "body": self.rfile.read(length).decode("utf-8") if length else None,
+                "isBase64Encoded": False,
+            }
+            
+            response = endpoint(event, None)
+            body = response.get("body", "").encode("utf-8")
+            
+            self.send_response(response.get("statusCode", 200))
+            for key, value in response.get("headers", {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        do_GET = _handle
+        do_POST = _handle
+        
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} - {format % args}")
+    
+    return EndpointRequestHandler
+
+def run_local_server(endpoint, port=8080):
+    """
+    Serve a Lambda function URL handler over HTTP on localhost until interrupted.
+    
+    Requests are handled on separate threads of one process, so concurrent requests
+    for the same query are all coalesced. On Lambda, each container handles one
+    request at a time, so only requests that reach the same warm container share
+    its cache, and concurrent requests are not coalesced.
+    
+    Args:
+        endpoint: A Lambda handler taking a function URL event and a context
+        port: The port to listen on
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_request_handler(endpoint))
+    print(f"Serving research endpoint on http://127.0.0.1:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
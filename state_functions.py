@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from config import STATE_BUCKET, STATE_PREFIX
+from json_functions import read_json, update_json, JSONProcessingError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Conditional writes retried this many times when another invocation updates the same object
+MAX_WRITE_CONFLICTS = 10
+
+class StateError(JSONProcessingError):
+    """Custom exception for shared state errors"""
+    pass
+
+_client = None
+
+def get_s3_client():
+    """Get the shared S3 client for STATE_BUCKET"""
+    global _client
+    if _client is None:
+        import boto3  # Provided by the Lambda runtime
+        _client = boto3.client("s3")
+    return _client
+
+def state_key(filename):
+    """The S3 key a state file is kept under in STATE_BUCKET"""
+    return f"{STATE_PREFIX}{os.path.basename(filename)}"
+
+def _get_object(client, filename):
+    """
+    Read a state object.
+
+    Returns:
+        tuple: (data, ETag), or (None, None) if the object doesn't exist yet
+    """
+    try:
+        response = client.get_object(Bucket=STATE_BUCKET, Key=state_key(filename))
+    except client.exceptions.NoSuchKey:
+        return None, None
+    return json.loads(response["Body"].read()), response["ETag"]
+
+def _is_write_conflict(client, error):
+    return (
+        isinstance(error, client.exceptions.ClientError)
+        and error.response.get("Error", {}).get("Code") in ("PreconditionFailed", "ConditionalRequestConflict")
+    )
+
+def load_state(filename, default):
+    """
+    Load a JSON state document, from STATE_BUCKET if set and from the local file otherwise.
+
+    Args:
+        filename: The local state file; in the bucket, its name is the object key
+        default: Factory for the data to return if the document doesn't exist yet
+
+    Returns:
+        The loaded data
+
+    Raises:
+        StateError: If the document exists but can't be read
+    """
+    if not STATE_BUCKET:
+        return read_json(filename) if os.path.exists(filename) else default()
+
+    try:
+        data, _ = _get_object(get_s3_client(), filename)
+    except Exception as e:
+        raise StateError(f"Error reading s3://{STATE_BUCKET}/{state_key(filename)}: {str(e)}")
+    return default() if data is None else data
+
+def update_state(filename, change, default):
+    """
+    Read, change and write back a JSON state document without losing concurrent updates.
+
+    Local files are updated under a file lock. In STATE_BUCKET, the document is written
+    with a conditional put on the ETag that was read, and the update is retried from a
+    fresh read if another invocation wrote it in between.
+
+    Args:
+        filename: The local state file; in the bucket, its name is the object key
+        change: Function that modifies the loaded data in place
+        default: Factory for the data to start from if the document doesn't exist yet
+
+    Returns:
+        The updated data
+
+    Raises:
+        StateError: If the document can't be read or written; an unreadable document is left as it is
+    """
+    if not STATE_BUCKET:
+        try:
+            return update_json(filename, change, default)
+        except JSONProcessingError as e:
+            raise StateError(str(e))
+
+    location = f"s3://{STATE_BUCKET}/{state_key(filename)}"
+    try:
+        client = get_s3_client()
+        for attempt in range(MAX_WRITE_CONFLICTS):
+            data, etag = _get_object(client, filename)
+            if data is None:
+                data = default()
+            change(data)
+
+            condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                client.put_object(
+                    Bucket=STATE_BUCKET, Key=state_key(filename), Body=json.dumps(data).encode(),
+                    ContentType="application/json", **condition
+                )
+                return data
+            except Exception as e:
+                if not _is_write_conflict(client, e):
+                    raise
+                logger.info(f"{location} changed while it was being updated, retrying")
+                time.sleep(0.05 * (attempt + 1))
+    except Exception as e:
+        raise StateError(f"Error updating {location}: {str(e)}")
+    raise StateError(f"Too much contention updating {location}")
+
+def _download(client, filename):
+    """
+    Download a binary state object into a temporary file.
+
+    Returns:
+        tuple: (path of the copy, ETag); without an object yet, the path doesn't exist and the ETag is None
+    """
+    descriptor, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+    try:
+        response = client.get_object(Bucket=STATE_BUCKET, Key=state_key(filename))
+    except client.exceptions.NoSuchKey:
+        os.close(descriptor)
+        os.remove(path)
+        return path, None
+    except Exception:
+        os.close(descriptor)
+        os.remove(path)
+        raise
+    with os.fdopen(descriptor, "wb") as file:
+        shutil.copyfileobj(response["Body"], file)
+    return path, response["ETag"]
+
+def _remove_copy(path):
+    # SQLite databases may leave journal files next to the copy
+    for leftover in (path, path + "-wal", path + "-shm", path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+@contextmanager
+def open_state_file(filename):
+    """
+    Get a local path to read a binary state file, such as a database, from.
+
+    With STATE_BUCKET set, this is a temporary copy of the bucket's object, removed
+    afterwards; otherwise it is the local file itself.
+
+    Args:
+        filename: The local state file; in the bucket, its name is the object key
+
+    Yields:
+        str: The path to read, which doesn't exist if the file hasn't been created yet
+
+    Raises:
+        StateError: If the object can't be downloaded
+    """
+    if not STATE_BUCKET:
+        yield filename
+        return
+
+    try:
+        path, _ = _download(get_s3_client(), filename)
+    except Exception as e:
+        raise StateError(f"Error reading s3://{STATE_BUCKET}/{state_key(filename)}: {str(e)}")
+    try:
+        yield path
+    finally:
+        _remove_copy(path)
+
+def update_state_file(filename, change):
+    """
+    Change a binary state file, such as a database, without losing concurrent updates.
+
+    Local files are changed in place; they have to handle concurrent writers themselves,
+    as SQLite does. In STATE_BUCKET, a copy of the object is changed and uploaded with a
+    conditional put on the ETag that was downloaded, and the change is redone on a
+    fresh copy if another invocation wrote the object in between.
+
+    Args:
+        filename: The local state file; in the bucket, its name is the object key
+        change: Function that modifies the file at the path it is given and returns a result
+
+    Returns:
+        The result of change
+
+    Raises:
+        StateError: If the object can't be downloaded or uploaded
+    """
+    if not STATE_BUCKET:
+        return change(filename)
+
+    location = f"s3://{STATE_BUCKET}/{state_key(filename)}"
+    client = get_s3_client()
+    for attempt in range(MAX_WRITE_CONFLICTS):
+        try:
+            path, etag = _download(client, filename)
+        except Exception as e:
+            raise StateError(f"Error reading {location}: {str(e)}")
+        try:
+            result = change(path)
+            condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+            try:
+                with open(path, "rb") as file:
+                    client.put_object(Bucket=STATE_BUCKET, Key=state_key(filename), Body=file, **condition)
+                return result
+            except Exception as e:
+                if not _is_write_conflict(client, e):
+                    raise StateError(f"Error updating {location}: {str(e)}")
+        finally:
+            _remove_copy(path)
+        logger.info(f"{location} changed while it was being updated, retrying")
+        time.sleep(0.05 * (attempt + 1))
+    raise StateError(f"Too much contention updating {location}")
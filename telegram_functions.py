@@ -4,6 +4,9 @@ import logging
 import requests
 from requests.exceptions import RequestException, Timeout, HTTPError
 import json
+from log_functions import log_payload
+from http_functions import get_http_session
+from render_functions import telegram_length, split_html, TELEGRAM_MESSAGE_LIMIT
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,17 +17,38 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
 
+# Room left in each chunk of a split message for its "Part i/n" prefix
+PART_PREFIX_RESERVE = 16
+
 class TelegramAPIError(Exception):
     """Custom exception for Telegram API errors"""
     pass
 
-async def send_message_telegram(message, link=None):
+async def send_message_telegram(message, link=None, chat_id=None):
     """
     Send a message to a Telegram channel with an optional link button.
     
     Args:
         message: The message text to send
         link: URL to include as a button (optional)
+        chat_id: The chat to send to (defaults to TELEGRAM_CHANNEL_ID)
+        
+    Returns:
+        dict: The JSON response from the Telegram API call
+        
+    Raises:
+        TelegramAPIError: If the API call fails
+    """
+    return send_message_telegram_sync(message, link, chat_id)
+
+def send_message_telegram_sync(message, link=None, chat_id=None):
+    """
+    Blocking version of send_message_telegram, for use from worker threads.
+    
+    Args:
+        message: The message text to send
+        link: URL to include as a button (optional)
+        chat_id: The chat to send to (defaults to TELEGRAM_CHANNEL_ID)
         
     Returns:
         dict: The JSON response from the Telegram API call
@@ -36,18 +60,19 @@ async def send_message_telegram(message, link=None):
         logger.error("TELEGRAM_BOT_TOKEN environment variable is not set")
         raise TelegramAPIError("Telegram Bot Token not configured. Please set the TELEGRAM_BOT_TOKEN environment variable.")
         
-    if not TELEGRAM_CHANNEL_ID:
+    chat_id = chat_id or TELEGRAM_CHANNEL_ID
+    if not chat_id:
         logger.error("TELEGRAM_CHANNEL_ID environment variable is not set")
         raise TelegramAPIError("Telegram Channel ID not configured. Please set the TELEGRAM_CHANNEL_ID environment variable.")
     
     # Telegram message character limit
-    MAX_MESSAGE_LENGTH = 4096
+    MAX_MESSAGE_LENGTH = TELEGRAM_MESSAGE_LIMIT
     
     # Helper function to make API calls to Telegram
     def call_telegram_api(text, include_button=False):
         url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
         data = {
-            "chat_id": TELEGRAM_CHANNEL_ID,
+            "chat_id": chat_id,
             "text": text,
             "parse_mode": "html"
         }
@@ -59,7 +84,7 @@ async def send_message_telegram(message, link=None):
             data["reply_markup"] = json.dumps(keyboard)
         
         try:
-            response = requests.post(url, json=data, timeout=30)
+            response = get_http_session().post(url, json=data, timeout=30)
             response.raise_for_status()
             
             json_response = response.json()
@@ -76,7 +101,7 @@ async def send_message_telegram(message, link=None):
             logger.error("Request to Telegram API timed out")
             raise TelegramAPIError("Request to Telegram API timed out")
         except HTTPError as e:
-            logger.error(f"HTTP error from Telegram API: {e.response.status_code} - {e.response.text}")
+            log_payload(logger, logging.ERROR, f"HTTP error from Telegram API: {e.response.status_code}", e.response.text, "api_error")
             raise TelegramAPIError(f"HTTP error from Telegram API: {e.response.status_code}")
         except RequestException as e:
             logger.error(f"Error making request to Telegram API: {str(e)}")
@@ -89,17 +114,17 @@ async def send_message_telegram(message, link=None):
             raise TelegramAPIError(f"Unexpected error when calling Telegram API: {str(e)}")
     
     # If message is within limits, send as a single message
-    if len(message) <= MAX_MESSAGE_LENGTH:
+    message_length = telegram_length(message)
+    if message_length <= MAX_MESSAGE_LENGTH:
         return call_telegram_api(message, include_button=(link is not None))
     
     # If message exceeds limit, split and send as multiple messages
     else:
-        logger.warning(f"Message exceeds Telegram's character limit ({len(message)} > {MAX_MESSAGE_LENGTH}). Splitting into multiple messages.")
+        logger.warning(f"Message exceeds Telegram's character limit ({message_length} > {MAX_MESSAGE_LENGTH}). Splitting into multiple messages.")
         
-        # Split the message into chunks of MAX_MESSAGE_LENGTH
-        chunks = []
-        for i in range(0, len(message), MAX_MESSAGE_LENGTH):
-            chunks.append(message[i:i + MAX_MESSAGE_LENGTH])
+        # Split the message into chunks that leave room for the part numbers,
+        # never inside a tag, an entity or a character
+        chunks = split_html(message, MAX_MESSAGE_LENGTH - PART_PREFIX_RESERVE)
         
         # Send all chunks except the last one without a button
         for i in range(len(chunks) - 1):
@@ -4,19 +4,54 @@ Test script to run the Info Ranger functions locally.
 This helps verify that your setup is working correctly before deployment.
 """
 
+import argparse
+import datetime
+import os
 import sys
 import importlib
+import time
+
+# Record/replay options have to be in the environment before config.py is imported
+def apply_cassette_options(argv):
+    """Move --record/--replay/--speed options from argv into the cassette environment variables"""
+    args = list(argv)
+    for option, mode in (("--record", "record"), ("--replay", "replay")):
+        if option in args:
+            i = args.index(option)
+            os.environ["CASSETTE_MODE"] = mode
+            os.environ["CASSETTE_FILE"] = args[i + 1]
+            del args[i:i + 2]
+    if "--speed" in args:
+        i = args.index("--speed")
+        os.environ["CASSETTE_SPEED"] = args[i + 1]
+        del args[i:i + 2]
+    if os.environ.get("CASSETTE_MODE") == "replay":
+        # Replays run offline, so real credentials aren't needed
+        for variable in ("PPLX_API_KEY", "OPENAI_API_KEY", "TELEGRAM_BOT_TOKEN", "TELEGRAM_CHANNEL_ID"):
+            os.environ.setdefault(variable, "replay")
+    return args
+
+sys.argv = apply_cassette_options(sys.argv)
+
 from handler import daily_research, weekly_research, monthly_research
 from config import CUSTOM_QUERIES
 
 def print_usage():
-    print("Usage: python test_locally.py [daily|weekly|monthly|custom:<name>|list]")
+    print("Usage: python test_locally.py [daily|weekly|monthly|custom:<name>|list|serve[:<port>]|search <keywords>] [options]")
     print("Examples:")
     print("  python test_locally.py daily       # Run daily research")
     print("  python test_locally.py weekly      # Run weekly research")
     print("  python test_locally.py monthly     # Run monthly research")
     print("  python test_locally.py custom:tech_news  # Run a custom query named 'tech_news'")
     print("  python test_locally.py list        # List all available custom queries")
+    print("  python test_locally.py serve:8080  # Serve the on-demand research endpoint locally")
+    print("  python test_locally.py search solar tariffs --since 2026-01-01  # Search delivered digests")
+    print("")
+    print("Options:")
+    print("  --record <file>   Record all API traffic to a JSONL cassette")
+    print("  --replay <file>   Replay API traffic from a cassette, offline")
+    print("  --speed <factor>  Replay latency scale: 0 no delay (default), 1 original timing")
+    print("Run 'python test_locally.py search --help' for search options")
 
 def list_custom_queries():
     """List all available custom queries from config.py"""
@@ -68,7 +103,44 @@ def run_custom_query(query_name):
         print(f"Custom query '{query_name}' completed!")
         return True
 
+def search(argv):
+    """Search the archive of delivered digests"""
+    from archive_functions import search_archive, ArchiveError
+    
+    parser = argparse.ArgumentParser(prog="test_locally.py search", description="Search delivered digests, best matches first")
+    parser.add_argument("keywords", nargs="*", help="Keywords that must all appear (latest items if none)")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, help="Only items delivered on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=datetime.date.fromisoformat, help="Only items delivered on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--query", help="Only items of this query (title, or name for custom queries)")
+    parser.add_argument("--limit", type=int, default=10, help="Maximum number of results (default 10)")
+    parser.add_argument("--raw", action="store_true", help="Treat the keywords as an FTS5 query, e.g. 'solar OR wind'")
+    args = parser.parse_args(argv)
+    
+    since = datetime.datetime.combine(args.since, datetime.time()) if args.since else None
+    until = datetime.datetime.combine(args.until + datetime.timedelta(days=1), datetime.time()) if args.until else None
+    started_at = time.perf_counter()
+    try:
+        results = search_archive(" ".join(args.keywords), since, until, args.query, args.limit, args.raw)
+    except ArchiveError as e:
+        print(f"Error: {str(e)}")
+        return
+    elapsed = (time.perf_counter() - started_at) * 1000
+    
+    for i, result in enumerate(results, 1):
+        score = f", score {result['score']:.2f}" if result["score"] is not None else ""
+        print(f"{i}. {result['title']}")
+        print(f"   {result['query_title']} / {result['category']}, delivered {result['delivered_at'][:16].replace('T', ' ')}{score}")
+        print(f"   {result['snippet'] or result['description'][:160]}")
+        if result["link"]:
+            print(f"   {result['link']}")
+        print()
+    print(f"{len(results)} result(s) in {elapsed:.1f} ms")
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1].lower() == "search":
+        search(sys.argv[2:])
+        return
+    
     if len(sys.argv) != 2:
         print_usage()
         return
@@ -79,6 +151,13 @@ def main():
         list_custom_queries()
         return
     
+    if command == "serve" or command.startswith("serve:"):
+        from handler import research_endpoint
+        from server_functions import run_local_server
+        port = int(command.split(":", 1)[1]) if ":" in command else 8080
+        run_local_server(research_endpoint, port)
+        return
+    
     if command.startswith("custom:"):
         query_name = command.split(":", 1)[1]
         run_custom_query(query_name)
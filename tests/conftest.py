@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the project modules from the repository root, like the Lambda handler does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+"""Tests of the digest archive, kept in a temporary database."""
+
+import datetime
+
+import pytest
+
+from archive_functions import archive_news_response, search_archive
+from news_models import NewsItem, NewsCategory, NewsResponse
+from sanitize_functions import sanitize_digest
+
+@pytest.fixture
+def archive_file(tmp_path):
+    return str(tmp_path / "archive.db")
+
+def archive(archive_file, category, title, description, link="https://example.com/a?x=1&y=2"):
+    digest = sanitize_digest(NewsResponse(news_items=[
+        NewsCategory(category=category, news_items=[NewsItem(title=title, description=description, link=link)])
+    ]))
+    return archive_news_response(digest, "Markets", "Markets", filename=archive_file)
+
+def test_sanitized_fields_are_archived_as_plain_text(archive_file):
+    assert archive(archive_file, "Tech & <Stuff>", "AT&T buys <NVDA>", "Shares of <b>AT&T</b> rose") == 1
+    result, = search_archive("AT&T", filename=archive_file)
+    assert result["category"] == "Tech & <Stuff>"
+    assert result["title"] == "AT&T buys <NVDA>"
+    assert result["description"] == "Shares of AT&T rose"
+    assert result["link"] == "https://example.com/a?x=1&y=2"
+
+def test_escaping_is_not_indexed(archive_file):
+    archive(archive_file, "Business", "AT&T results", "Revenue grew")
+    assert search_archive("amp", filename=archive_file) == []
+    assert search_archive("lt", filename=archive_file) == []
+
+def test_search_ranks_title_matches_first(archive_file):
+    archive(archive_file, "Energy", "Grid upgrade", "Solar capacity doubled")
+    archive(archive_file, "Energy", "Solar tariffs cut", "Panels get cheaper")
+    assert [result["title"] for result in search_archive("solar", filename=archive_file)] == [
+        "Solar tariffs cut", "Grid upgrade"
+    ]
+    assert search_archive("solar", until=datetime.datetime(2000, 1, 1), filename=archive_file) == []
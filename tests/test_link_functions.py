@@ -0,0 +1,120 @@
+"""Tests of citation link cleaning, checked against a local HTTP stand-in."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from link_functions import canonicalize_url, clean_citations, clean_links, link_key, load_link_cache, save_link_cache
+from news_models import NewsItem, NewsCategory, NewsResponse
+from rollup_functions import merge_news_responses
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Pages: /live/*, /redirect/* (to /live/* with tracking parameters), /dead/*, /no-head/*"""
+    requests = 0
+
+    def handle_request(self, head):
+        StandInHandler.requests += 1
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/redirect/"):
+            self.send_response(301)
+            self.send_header("Location", path.replace("/redirect/", "/live/", 1) + "?utm_source=feed&id=7")
+        elif path.startswith("/dead/"):
+            self.send_response(404)
+        elif path.startswith("/no-head/") and head:
+            self.send_response(405)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "link_cache.json")
+
+def test_canonicalize_url():
+    assert canonicalize_url("HTTPS://WWW.Example.COM:443/a?utm_source=x&b=1&fbclid=y#top") == "https://www.example.com/a?b=1"
+    assert canonicalize_url("https://example.com/app#/route?gclid=1") == "https://example.com/app#/route?gclid=1"
+    assert canonicalize_url("not a url") == "not a url"
+
+def test_link_key_ignores_scheme_www_and_trailing_slash():
+    assert link_key("http://www.example.com/a/") == link_key("https://example.com/a")
+    assert link_key("https://EXAMPLE.com/a") == link_key("https://example.com/a")
+
+def test_link_key_keeps_path_and_query_case():
+    assert link_key("https://bit.ly/AbCd") != link_key("https://bit.ly/abcd")
+    assert link_key("https://example.com/a?id=X") != link_key("https://example.com/a?id=x")
+    assert clean_citations(["https://bit.ly/AbCd", "https://bit.ly/abcd"], resolve=False) == [
+        ([1], "https://bit.ly/AbCd"), ([2], "https://bit.ly/abcd")
+    ]
+
+def test_merge_keeps_links_differing_in_case():
+    primary = NewsResponse(news_items=[NewsCategory(category="A", news_items=[
+        NewsItem(title="One", description="First", link="https://bit.ly/AbCd"),
+    ])])
+    extra = NewsResponse(news_items=[NewsCategory(category="A", news_items=[
+        NewsItem(title="Two", description="Second", link="https://bit.ly/abcd"),
+        NewsItem(title="One again", description="Duplicate", link="https://BIT.LY/AbCd/"),
+    ])])
+    merged = merge_news_responses(primary, extra)
+    assert [item.title for item in merged.news_items[0].news_items] == ["One", "Two"]
+
+def test_clean_links_resolves_against_stand_in(base, cache_file):
+    links = [
+        f"{base}/live/1?utm_medium=email",
+        f"{base}/live/1",
+        f"{base}/redirect/2",
+        f"{base}/dead/3",
+        f"{base}/no-head/4?fbclid=abc",
+    ]
+    cleaned = clean_links(links, resolve=True, filename=cache_file)
+    assert cleaned[links[0]] == f"{base}/live/1"
+    assert cleaned[links[2]] == f"{base}/live/2?id=7"
+    assert cleaned[links[3]] is None
+    assert cleaned[links[4]] == f"{base}/no-head/4"
+
+def test_clean_citations_merges_duplicates_and_drops_dead_links(base, cache_file):
+    links = [
+        f"{base}/live/1?utm_medium=email",
+        f"{base}/live/1",
+        f"{base}/redirect/2",
+        f"{base}/dead/3",
+        f"{base}/no-head/4?fbclid=abc",
+    ]
+    assert clean_citations(links, resolve=True, filename=cache_file) == [
+        ([1, 2], f"{base}/live/1"), ([3], f"{base}/live/2?id=7"), ([5], f"{base}/no-head/4")
+    ]
+
+def test_cached_results_are_reused(base, cache_file):
+    url = f"{base}/redirect/5"
+    assert clean_links([url], resolve=True, filename=cache_file)[url] == f"{base}/live/5?id=7"
+    requests = StandInHandler.requests
+    assert clean_links([url], resolve=True, filename=cache_file)[url] == f"{base}/live/5?id=7"
+    assert StandInHandler.requests == requests
+
+def test_saving_keeps_links_cached_by_other_runs(cache_file):
+    now = time.time()
+    save_link_cache({"https://example.com/a": {"final": "https://example.com/a", "alive": True, "checked": now}}, cache_file)
+    save_link_cache({
+        "https://example.com/b": {"final": "https://example.com/b", "alive": False, "checked": now},
+        "https://example.com/old": {"final": "https://example.com/old", "alive": True, "checked": 0},
+    }, cache_file)
+    assert sorted(load_link_cache(cache_file)) == ["https://example.com/a", "https://example.com/b"]
@@ -0,0 +1,48 @@
+"""Tests of Telegram HTML sanitizing, including text that only looks like markup."""
+
+import pytest
+
+from news_models import NewsItem, NewsCategory, NewsResponse
+from render_functions import render_news_blocks
+from sanitize_functions import sanitize_html, sanitize_digest
+
+@pytest.mark.parametrize("text, expected", [
+    ("Nvidia <NVDA> rose 4%", "Nvidia &lt;NVDA&gt; rose 4%"),
+    ("Price <Rs 500 crore> deal", "Price &lt;Rs 500 crore&gt; deal"),
+    ("If x<y and z>w", "If x&lt;y and z&gt;w"),
+    ("Tech & <Stuff>", "Tech &amp; &lt;Stuff&gt;"),
+    ("a<b then c>d", "a&lt;b then c&gt;d"),
+    ("rates <3%", "rates &lt;3%"),
+])
+@pytest.mark.parametrize("allow_tags", [True, False])
+def test_text_that_looks_like_a_tag_is_escaped(text, expected, allow_tags):
+    sanitized, repairs = sanitize_html(text, allow_tags)
+    assert sanitized == expected
+    assert repairs > 0
+
+def test_allowed_tags_are_kept_and_repaired():
+    text = '<b>bold</b> <a href="https://x.com/?a=1&b=2" target="_blank">link</a> <blockquote expandable>q</blockquote><br>x <i>open'
+    sanitized, repairs = sanitize_html(text)
+    assert sanitized == '<b>bold</b> <a href="https://x.com/?a=1&amp;b=2">link</a> <blockquote expandable>q</blockquote>\nx <i>open</i>'
+    assert repairs == 3
+
+def test_tags_are_stripped_when_not_allowed():
+    assert sanitize_html("<b>Title</b> <NVDA>", allow_tags=False) == ("Title &lt;NVDA&gt;", 3)
+
+def test_tags_inside_code_are_stripped():
+    assert sanitize_html("<code>1<b>2</b> x<y</code>") == ("<code>12 x&lt;y</code>", 3)
+
+def test_clean_text_is_unchanged():
+    text = '<b>Markets</b> &amp; <a href="https://example.com/">rates</a> &#8377;'
+    assert sanitize_html(text) == (text, 0)
+
+def test_digest_keeps_tag_like_text_in_titles_and_categories():
+    digest = sanitize_digest(NewsResponse(news_items=[
+        NewsCategory(category="Tech & <Stuff>", news_items=[
+            NewsItem(title="a<b then c>d", description="Nvidia <NVDA> rose 4%", link="https://example.com/nvda")
+        ])
+    ]))
+    message = "".join(render_news_blocks(digest, "Digest"))
+    assert "Tech &amp; &lt;Stuff&gt;" in message
+    assert "a&lt;b then c&gt;d" in message
+    assert "Nvidia &lt;NVDA&gt; rose 4%" in message
@@ -0,0 +1,157 @@
+import logging
+import statistics
+import time
+from config import (
+    MODEL, FORMATTING_MODEL, QUALITY_TIERS, MODEL_CATALOG, MONTHLY_BUDGET, BUDGET_DOWNGRADE_AT,
+    MODEL_DEADLINE_SHARE
+)
+from history_functions import load_run_history, get_month_spend
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_MODELS = {"research": MODEL, "formatting": FORMATTING_MODEL}
+
+def estimate_tokens(text):
+    """Rough token count of a text, at about four characters per token"""
+    return len(text) // 4 + 1
+
+def estimate_cost(role, model, input_tokens, output_tokens):
+    """
+    Estimate the cost of a model call from the catalog prices.
+
+    Returns:
+        float: The cost in dollars, or 0 for models missing from MODEL_CATALOG
+    """
+    prices = MODEL_CATALOG.get(role, {}).get(model)
+    if prices is None:
+        return 0.0
+    return (
+        prices["request_price"]
+        + input_tokens * prices["input_price"] / 1_000_000
+        + output_tokens * prices["output_price"] / 1_000_000
+    )
+
+def get_deadline(context):
+    """
+    Get the monotonic time by which a Lambda invocation must finish.
+
+    Args:
+        context: The Lambda context (None when running locally)
+
+    Returns:
+        float: The deadline, or None if the invocation has no time limit
+    """
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000
+
+def get_model_policy(query):
+    """Get the model policy of a query, with defaults for missing keys"""
+    return dict({"tier": None, "latency_slo": None, "max_cost": None}, **query.get("model_policy", {}))
+
+def expected_model_stats(role, model, history):
+    """
+    Expected latency and output tokens of a model call.
+
+    The median recorded latency and mean recorded output tokens are used once the
+    model has been called; until then the catalog values are.
+
+    Returns:
+        tuple: (latency in seconds, output tokens)
+    """
+    catalog = MODEL_CATALOG[role][model]
+    recorded = history.get("models", {}).get(model, {})
+    latency = statistics.median(recorded["latencies"]) if recorded.get("latencies") else catalog["latency"]
+    output_tokens = statistics.mean(recorded["output_tokens"]) if recorded.get("output_tokens") else catalog["output_tokens"]
+    return latency, output_tokens
+
+def select_model(role, policy, prompt, deadline=None, history=None):
+    """
+    Pick the model for a call that meets a query's model policy.
+
+    Among the catalog models that meet the latency SLO, the cost ceiling and the
+    invocation deadline, the cheapest one of at least the policy's tier is chosen.
+    Without a tier the configured default model is preferred. The tier drops by one
+    once BUDGET_DOWNGRADE_AT of MONTHLY_BUDGET is spent, and to the lowest once it is
+    all spent. If no model of the tier meets the limits, the best one that does is
+    chosen, and if none does, the fastest.
+
+    Args:
+        role: "research" or "formatting"
+        policy: The query's model policy
+        prompt: The full prompt text of the call
+        deadline: Monotonic time by which the invocation must finish, if any
+        history: The run history (loaded from disk if None)
+
+    Returns:
+        dict: The chosen 'model', its 'tier', 'expected_latency', 'expected_cost' and the 'reason'
+    """
+    catalog = MODEL_CATALOG[role]
+    default_model = DEFAULT_MODELS[role]
+    if not policy.get("tier") and default_model not in catalog:
+        return {
+            "model": default_model, "tier": None, "expected_latency": None, "expected_cost": None,
+            "reason": "default model, not in MODEL_CATALOG",
+        }
+
+    history = history if history is not None else load_run_history()
+    reasons = []
+
+    quality = QUALITY_TIERS[policy.get("tier") or catalog[default_model]["tier"]]
+
+    if MONTHLY_BUDGET:
+        spend = get_month_spend(history)
+        if spend >= MONTHLY_BUDGET:
+            quality = min(QUALITY_TIERS.values())
+            reasons.append(f"monthly budget spent (${spend:.2f})")
+        elif spend >= MONTHLY_BUDGET * BUDGET_DOWNGRADE_AT:
+            quality = max(quality - 1, min(QUALITY_TIERS.values()))
+            reasons.append(f"monthly budget nearly spent (${spend:.2f} of ${MONTHLY_BUDGET:.2f})")
+
+    time_left = None
+    if deadline is not None:
+        time_left = (deadline - time.monotonic()) * MODEL_DEADLINE_SHARE[role]
+
+    input_tokens = estimate_tokens(prompt)
+    estimates = {}
+    for model in catalog:
+        latency, output_tokens = expected_model_stats(role, model, history)
+        estimates[model] = (latency, estimate_cost(role, model, input_tokens, output_tokens))
+
+    def within_limits(model):
+        latency, cost = estimates[model]
+        return (
+            (policy.get("latency_slo") is None or latency <= policy["latency_slo"])
+            and (policy.get("max_cost") is None or cost <= policy["max_cost"])
+            and (time_left is None or latency <= time_left)
+        )
+
+    feasible = [model for model in catalog if within_limits(model)]
+    qualified = [model for model in feasible if QUALITY_TIERS[catalog[model]["tier"]] >= quality]
+
+    if not policy.get("tier") and not reasons and default_model in qualified:
+        model = default_model
+        reasons.append("default model")
+    elif qualified:
+        model = min(qualified, key=lambda model: (estimates[model][1], estimates[model][0]))
+        reasons.append("cheapest model of the tier")
+    elif feasible:
+        model = max(feasible, key=lambda model: (QUALITY_TIERS[catalog[model]["tier"]], -estimates[model][1]))
+        limits = "invocation deadline" if time_left is not None and all(
+            estimates[m][0] > time_left for m in catalog if QUALITY_TIERS[catalog[m]["tier"]] >= quality
+        ) else "latency and cost limits"
+        reasons.append(f"downgraded to meet the {limits}")
+    else:
+        model = min(catalog, key=lambda model: estimates[model][0])
+        reasons.append("no model meets the policy, using the fastest")
+
+    latency, cost = estimates[model]
+    return {
+        "model": model,
+        "tier": catalog[model]["tier"],
+        "expected_latency": round(latency, 1),
+        "expected_cost": round(cost, 4),
+        "reason": ", ".join(reasons),
+    }